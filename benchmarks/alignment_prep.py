@@ -0,0 +1,94 @@
+"""Benchmark alignment window preparation in SpikesAlignment.make
+
+Compares the former per-row `iterrows` loop with `_get_trial_event_arrays` and
+`_get_window_limits` on a synthetic trialized event table, and checks that both
+give the same trials, event times and window limits.
+
+    python benchmarks/alignment_prep.py --n-trials 240 2000 20000 --repeat 5
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from workflow_array_ephys.analysis import _get_trial_event_arrays, _get_window_limits
+
+
+def _make_trialized_event_times(n_trials: int, missing_fraction: float = 0.1):
+    """Return a table shaped like trial.get_trialized_alignment_event_times output"""
+    rng = np.random.default_rng(0)
+    starts = np.arange(n_trials) * 5.0
+    events = starts + rng.uniform(0.5, 1.5, n_trials)
+    ends = events + rng.uniform(1.0, 2.0, n_trials)
+    rows = [
+        {"trial_key": {"trial_id": i}, "start": start, "event": event, "end": end}
+        for i, (start, event, end) in enumerate(zip(starts, events, ends))
+    ]
+    for i in rng.choice(n_trials, int(n_trials * missing_fraction), replace=False):
+        rows[i].update(start=None, event=None, end=None)
+    return pd.DataFrame(rows)
+
+
+def _iterrows_prep(trialized_event_times) -> tuple:
+    """Window preparation as done before, one pandas row at a time"""
+    min_limit = (trialized_event_times.event - trialized_event_times.start).max()
+    max_limit = (trialized_event_times.end - trialized_event_times.event).max()
+
+    trial_keys, event_times = [], []
+    for _, r in trialized_event_times.iterrows():
+        if np.isnan(r.event):
+            continue
+        trial_keys.append(r.trial_key)
+        event_times.append(r.event)
+    return trial_keys, np.array(event_times, dtype=float), min_limit, max_limit
+
+
+def _array_prep(trialized_event_times) -> tuple:
+    """Window preparation on contiguous arrays with one NaN mask"""
+    trial_indices, event_times, start_times, end_times = _get_trial_event_arrays(
+        trialized_event_times
+    )
+    min_limit, max_limit = _get_window_limits(event_times, start_times, end_times)
+    trial_keys = trialized_event_times["trial_key"].iloc[trial_indices].tolist()
+    return trial_keys, event_times, min_limit, max_limit
+
+
+def _best_time(func, repeat: int) -> tuple:
+    """Return the result of func and its fastest run time in seconds"""
+    run_times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        run_times.append(time.perf_counter() - start_time)
+    return result, min(run_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-trials", type=int, nargs="+", default=[240, 2000, 20000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method")
+    args = parser.parse_args()
+
+    print(f"{'trials':>8s} {'iterrows (us/trial)':>20s} {'arrays (us/trial)':>18s}")
+    for n_trials in args.n_trials:
+        trialized_event_times = _make_trialized_event_times(n_trials)
+
+        expected, loop_time = _best_time(
+            lambda: _iterrows_prep(trialized_event_times), args.repeat
+        )
+        result, array_time = _best_time(
+            lambda: _array_prep(trialized_event_times), args.repeat
+        )
+
+        assert result[0] == expected[0]
+        assert np.array_equal(result[1], expected[1])
+        assert result[2:] == expected[2:]
+        print(
+            f"{n_trials:8d} {loop_time / n_trials * 1e6:20.2f} "
+            + f"{array_time / n_trials * 1e6:18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark the csv side of ingest_lab on a large synthetic user/project registry
+
+Compares reading each csv once per table (as `ingest_csv_to_table` does) with the
+single-read fan-out used by ingest_lab, and counts the rows each sends to insert.
+Nothing is inserted; the table headings are read from the configured database.
+
+    python benchmarks/ingest_lab_fan_out.py --n-users 20000 --n-projects 5000
+"""
+import argparse
+import csv
+import tempfile
+import time
+from pathlib import Path
+
+from workflow_array_ephys.ingest import _project_rows, _read_csv_rows
+from workflow_array_ephys.pipeline import lab, project
+
+
+def _write_registry(csv_dir: Path, n_users: int, n_projects: int) -> dict:
+    """Write synthetic lab csvs, returning their paths by name"""
+    n_labs = max(n_users // 50, 1)
+    columns = {
+        "labs": "lab,lab_name,organization,org_name,address,time_zone,location,"
+        + "location_description",
+        "projects": "project,project_description,project_title,project_start_date,"
+        + "repository_url,repository_name,codeurl",
+        "publications": "project,publication",
+        "keywords": "project,keyword",
+        "protocols": "protocol,protocol_type,protocol_description",
+        "users": "lab,user,user_role,user_email,user_cellphone",
+        "project_users": "user,project",
+    }
+    rows = {
+        "labs": [
+            [f"Lab{i}", f"Lab {i}", f"Org{i % 10}", f"Org {i % 10}", "addr", "UTC+0"]
+            + [f"Building{i}", "desc"]
+            for i in range(n_labs)
+        ],
+        "projects": [
+            [f"Proj{i}", "desc", f"Project {i}", "2020-01-01", "url", "repo", "url"]
+            for i in range(n_projects)
+        ],
+        "publications": [[f"Proj{i}", f"arXiv:{i}"] for i in range(n_projects)],
+        "keywords": [[f"Proj{i}", f"kw{i % 20}"] for i in range(n_projects)],
+        "protocols": [[f"Prot{i}", f"type{i % 5}", "desc"] for i in range(100)],
+        "users": [
+            [f"Lab{i % n_labs}", f"User{i}", f"role{i % 5}", "a@b.c", "0"]
+            for i in range(n_users)
+        ],
+        "project_users": [
+            [f"User{i}", f"Proj{i % n_projects}"] for i in range(n_users)
+        ],
+    }
+    csv_paths = {}
+    for name, header in columns.items():
+        csv_paths[name] = csv_dir / f"{name}.csv"
+        with open(csv_paths[name], "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header.split(","))
+            writer.writerows(rows[name])
+    return csv_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-users", type=int, default=20000)
+    parser.add_argument("--n-projects", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as csv_dir:
+        p = _write_registry(Path(csv_dir), args.n_users, args.n_projects)
+        # csv feeding each table, as in ingest_lab
+        csv_tables = [
+            (p["labs"], lab.Organization()),
+            (p["labs"], lab.Lab()),
+            (p["labs"], lab.Lab.Organization()),
+            (p["labs"], lab.Location()),
+            (p["projects"], lab.Project()),
+            (p["projects"], lab.ProjectSourceCode()),
+            (p["publications"], lab.ProjectPublication()),
+            (p["keywords"], lab.ProjectKeywords()),
+            (p["protocols"], lab.ProtocolType()),
+            (p["protocols"], lab.Protocol()),
+            (p["users"], lab.UserRole()),
+            (p["users"], lab.User()),
+            (p["users"], lab.LabMembership()),
+            (p["project_users"], lab.ProjectUser()),
+            (p["projects"], project.Project()),
+            (p["project_users"], project.ProjectPersonnel()),
+            (p["keywords"], project.ProjectKeywords()),
+            (p["publications"], project.ProjectPublication()),
+            (p["projects"], project.ProjectSourceCode()),
+        ]
+        for table in {id(t): t for _, t in csv_tables}.values():
+            table.heading  # load headings before timing
+
+        start_time = time.perf_counter()
+        per_table_rows = sum(len(_read_csv_rows(c)) for c, _ in csv_tables)
+        per_table_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        distinct_csvs = dict.fromkeys(c for c, _ in csv_tables)
+        csv_rows = {c: _read_csv_rows(c) for c in distinct_csvs}
+        fan_out_rows = sum(len(_project_rows(csv_rows[c], t)) for c, t in csv_tables)
+        fan_out_time = time.perf_counter() - start_time
+
+    print(f"{'':12s} {'csv reads':>10s} {'rows sent':>10s} {'time (s)':>10s}")
+    print(
+        f"{'per table':12s} {len(csv_tables):10d} {per_table_rows:10d} "
+        + f"{per_table_time:10.3f}"
+    )
+    print(
+        f"{'fan-out':12s} {len(csv_rows):10d} {fan_out_rows:10d} "
+        + f"{fan_out_time:10.3f}"
+    )
+    print(f"speedup: {per_table_time / fan_out_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
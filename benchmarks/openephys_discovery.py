@@ -0,0 +1,57 @@
+"""Benchmark OpenEphys probe discovery for session ingest
+
+Compares the full openephys.OpenEphys loader with the settings.xml reader used by
+ingest_sessions, on OpenEphys session directories relative to the ephys root data
+directory (as listed in sessions.csv). Also checks that both agree.
+
+    python benchmarks/openephys_discovery.py subject4/experiment1 --repeat 5
+"""
+import argparse
+import time
+
+from element_array_ephys.readers import openephys
+from element_interface.utils import find_full_path
+
+from workflow_array_ephys.ingest import _read_openephys_header
+from workflow_array_ephys.paths import get_ephys_root_data_dir
+
+
+def _best_time(func, repeat: int) -> tuple:
+    """Return the result of func and its fastest run time in seconds"""
+    run_times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        run_times.append(time.perf_counter() - start_time)
+    return result, min(run_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("session_dirs", nargs="+", help="OpenEphys session dirs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per reader")
+    args = parser.parse_args()
+
+    print(f"{'session_dir':40s} {'full (s)':>10s} {'header (s)':>10s} {'speedup':>8s}")
+    for rel_dir in args.session_dirs:
+        session_dir = find_full_path(get_ephys_root_data_dir(), rel_dir)
+
+        loaded_oe, full_time = _best_time(
+            lambda: openephys.OpenEphys(session_dir), args.repeat
+        )
+        header, header_time = _best_time(
+            lambda: _read_openephys_header(session_dir), args.repeat
+        )
+
+        assert header["datetime"] == loaded_oe.experiment.datetime
+        assert [(p["probe_model"], p["probe_SN"]) for p in header["probes"]] == [
+            (p.probe_model, p.probe_SN) for p in loaded_oe.probes.values()
+        ]
+        print(
+            f"{rel_dir:40s} {full_time:10.3f} {header_time:10.3f} "
+            + f"{full_time / header_time:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from workflow_array_ephys import analysis
+from workflow_array_ephys.analysis import (
+    SpikesAlignment,
+    _align_spikes,
+    _bootstrap_psth_bands,
+    _get_trial_event_arrays,
+    _get_window_limits,
+    _population_histogram,
+    _smooth_psth,
+    _split_ragged,
+    _trial_spike_counts,
+)
+
+
+def _mask_align(spike_times, event_times, min_limit, max_limit):
+    """Reference per-trial boolean-mask alignment"""
+    return [
+        spike_times[
+            (event - min_limit <= spike_times) & (spike_times < event + max_limit)
+        ]
+        - event
+        for event in event_times.tolist()
+    ]
+
+
+def test_align_spikes_matches_mask():
+    rng = np.random.default_rng(0)
+    spike_times = np.sort(rng.uniform(0, 100, 5000))
+    event_times = np.sort(rng.uniform(0, 100, 200))
+
+    aligned = _align_spikes(spike_times, event_times, 0.5, 1.3)
+    expected = _mask_align(spike_times, event_times, 0.5, 1.3)
+
+    assert len(aligned) == len(expected)
+    assert all(np.array_equal(a, e) for a, e in zip(aligned, expected))
+
+
+def test_align_spikes_unsorted_keeps_order():
+    rng = np.random.default_rng(1)
+    spike_times = rng.uniform(0, 100, 5000)
+    event_times = np.sort(rng.uniform(0, 100, 200))
+
+    aligned = _align_spikes(spike_times, event_times, 0.5, 1.3)
+    expected = _mask_align(spike_times, event_times, 0.5, 1.3)
+
+    assert all(np.array_equal(a, e) for a, e in zip(aligned, expected))
+
+
+def test_split_ragged_roundtrip():
+    trials = [np.array([0.1, 0.2]), np.array([]), np.array([-0.3, 0.0, 0.4])]
+    values = np.concatenate(trials)
+    offsets = np.concatenate([[0], np.cumsum([len(t) for t in trials])])
+
+    split = _split_ragged(values, offsets)
+
+    assert len(split) == len(trials)
+    assert all(np.array_equal(s, t) for s, t in zip(split, trials))
+
+
+def test_population_histogram_matches_np_histogram():
+    rng = np.random.default_rng(2)
+    edges = np.arange(-0.5, 1.3, 0.04)
+    units_spikes = [rng.uniform(-0.6, 1.4, n) for n in (0, 1, 500, 3000)]
+    units_spikes.append(edges.copy())  # spikes exactly on every edge
+
+    counts = _population_histogram(units_spikes, edges)
+
+    assert counts.shape == (len(units_spikes), len(edges) - 1)
+    for unit_counts, spikes in zip(counts, units_spikes):
+        assert np.array_equal(unit_counts, np.histogram(spikes, bins=edges)[0])
+
+
+def test_trial_spike_counts_chunked():
+    rng = np.random.default_rng(4)
+    edges = np.arange(-0.5, 1.3, 0.04)
+    units_aligned_spikes = [
+        [rng.uniform(-0.6, 1.4, rng.integers(0, 50)) for _ in range(7)]
+        for _ in range(5)
+    ]
+
+    spike_counts = _trial_spike_counts(units_aligned_spikes, 7, edges, 100)
+
+    assert spike_counts.dtype == np.uint16
+    assert spike_counts.shape == (5, 7, len(edges) - 1)
+    for unit_counts, unit_spikes in zip(spike_counts, units_aligned_spikes):
+        for trial_counts, spikes in zip(unit_counts, unit_spikes):
+            assert np.array_equal(trial_counts, np.histogram(spikes, bins=edges)[0])
+
+
+def test_trial_spike_counts_widened():
+    edges = np.array([0.0, 1.0, 2.0])
+    units_aligned_spikes = [[np.array([0.5])], [np.full(70000, 1.5)]]
+
+    spike_counts = _trial_spike_counts(units_aligned_spikes, 1, edges, 2)
+
+    assert spike_counts.dtype == np.uint32
+    assert spike_counts[:, 0].tolist() == [[1, 0], [0, 70000]]
+
+
+def test_smooth_psth_kernels():
+    impulse = np.zeros((2, 101))
+    impulse[:, 50] = 1.0
+
+    gaussian = _smooth_psth(impulse, 0.01, "gaussian", 0.05)
+    causal = _smooth_psth(impulse, 0.01, "causal", 0.05)
+
+    assert _smooth_psth(impulse, 0.01, "none", 0) is impulse
+    assert np.isclose(gaussian.sum(), 2.0)
+    assert np.allclose(gaussian[:, 40:50], gaussian[:, 60:50:-1])
+    assert gaussian[0].argmax() == 50
+    assert np.allclose(causal[:, :50], 0)
+    assert causal[0].argmax() == 50
+
+
+def test_bootstrap_psth_bands():
+    rng = np.random.default_rng(3)
+    trial_counts = rng.poisson(2.0, size=(3, 20, 15))
+    psth = trial_counts.sum(axis=1) / 20 / 0.04
+    all_trials = np.ones((5, 20))
+    resamples = rng.multinomial(20, np.full(20, 1 / 20), size=1000).astype(float)
+
+    unresampled = _bootstrap_psth_bands(trial_counts, all_trials, 0.04, (2.5, 97.5))
+    lower, upper = _bootstrap_psth_bands(trial_counts, resamples, 0.04, (2.5, 97.5))[0]
+
+    assert unresampled.shape == (3, 2, 15)
+    assert np.allclose(unresampled[:, 0], psth)
+    assert np.allclose(unresampled[:, 1], psth)
+    assert np.all(lower <= psth[0]) and np.all(psth[0] <= upper)
+
+
+def test_trial_event_arrays_drop_missing_events():
+    import pandas as pd
+
+    trialized_event_times = pd.DataFrame(
+        [
+            {"trial_key": {"trial_id": 1}, "start": 0.0, "event": 0.5, "end": 2.0},
+            {"trial_key": {"trial_id": 2}, "start": None, "event": None, "end": None},
+            {"trial_key": {"trial_id": 3}, "start": 3.0, "event": 4.0, "end": 4.5},
+        ]
+    )
+
+    trial_indices, event_times, start_times, end_times = _get_trial_event_arrays(
+        trialized_event_times
+    )
+
+    assert trial_indices.tolist() == [0, 2]
+    assert event_times.tolist() == [0.5, 4.0]
+    assert _get_window_limits(event_times, start_times, end_times) == (1.0, 1.5)
+
+
+class _Rows:
+    """Rows of a table, restricted by dict keys only"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __and__(self, restriction):
+        if not isinstance(restriction, dict):
+            return self
+        return _Rows(
+            [r for r in self.rows if all(r[k] == v for k, v in restriction.items())]
+        )
+
+    def __sub__(self, other):
+        return self
+
+    def fetch(self, *attributes, order_by=None):
+        keys = [{k: r[k] for k in ("curation_id", "unit") if k in r} for r in self.rows]
+        if attributes == ("KEY",):
+            return keys
+        return keys, [r["spike_times"] for r in self.rows]
+
+
+class _SpikesAlignment:
+    """Records the populate calls of SpikesAlignment.populate_by_curation"""
+
+    key_source = _Rows([])
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def populate(self, *restrictions, make_kwargs=None, **populate_kwargs):
+        self.calls.append((restrictions, make_kwargs["curation_units"]))
+        return self.result
+
+
+@pytest.mark.parametrize(
+    "populate_result",
+    [
+        [("key", "error")],  # datajoint 0.14.0 and 0.14.1
+        {"success_count": 0, "error_list": [("key", "error")]},  # datajoint>=0.14.2
+    ],
+)
+def test_populate_by_curation(monkeypatch, populate_result):
+    curated_clustering = _Rows([{"curation_id": 1}, {"curation_id": 2}])
+    curated_clustering.Unit = _Rows(
+        [
+            {"curation_id": 1, "unit": 0, "spike_times": [0.1]},
+            {"curation_id": 1, "unit": 1, "spike_times": [0.2]},
+            {"curation_id": 2, "unit": 0, "spike_times": [0.3]},
+        ]
+    )
+    monkeypatch.setattr(
+        analysis,
+        "_linking_module",
+        SimpleNamespace(ephys=SimpleNamespace(CuratedClustering=curated_clustering)),
+    )
+    table = _SpikesAlignment(populate_result)
+
+    error_list = SpikesAlignment.populate_by_curation(table, suppress_errors=True)
+
+    assert [restrictions for restrictions, _ in table.calls] == [
+        ({"curation_id": 1},),
+        ({"curation_id": 2},),
+    ]
+    assert [spike_times for _, (_, spike_times) in table.calls] == [
+        [[0.1], [0.2]],
+        [[0.3]],
+    ]
+    assert error_list == [("key", "error"), ("key", "error")]
+    assert SpikesAlignment.populate_by_curation(table) is None
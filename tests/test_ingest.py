@@ -1,7 +1,10 @@
 import os
 import pathlib
 import sys
+from datetime import datetime
+from types import SimpleNamespace
 
+import pytest
 from element_interface.utils import find_full_path, find_root_directory
 
 docker_root = "/main/test_data/workflow_ephys_data1"
@@ -107,3 +110,266 @@ def test_paramset_insert(kilosort_paramset, pipeline):
         dict_to_uuid({**kilosort_paramset, "clustering_method": method})
         == paramset_hash
     )
+
+
+def test_find_files_cached(tmp_path, monkeypatch):
+    from workflow_array_ephys import ingest
+
+    (tmp_path / "probe_g0").mkdir()
+    (tmp_path / "probe_g0" / "probe_g0_t0.imec0.ap.meta").touch()
+    (tmp_path / "probe_g0" / "probe_g0_t0.imec0.ap.bin").touch()
+    (tmp_path / "removed").mkdir()
+    previous_index = {}
+    ingest._find_files_cached(tmp_path, {}, previous_index)
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(
+        ingest.os, "scandir", lambda path: listed.append(path) or scandir(path)
+    )
+    (tmp_path / "removed").rmdir()
+    (tmp_path / "probe_g1").mkdir()
+    (tmp_path / "probe_g1" / "probe_g1_t0.imec1.ap.meta").touch()
+    discovery_index = {}
+    filepaths = ingest._find_files_cached(tmp_path, previous_index, discovery_index)
+
+    assert sorted(filepaths) == [
+        tmp_path / "probe_g0" / "probe_g0_t0.imec0.ap.meta",
+        tmp_path / "probe_g1" / "probe_g1_t0.imec1.ap.meta",
+    ]
+    assert listed == [tmp_path, tmp_path / "probe_g1"]  # probe_g0 is unchanged
+    assert sorted(discovery_index) == [
+        (tmp_path / name).as_posix() for name in ("", "probe_g0", "probe_g1")
+    ]
+
+
+class _Table:
+    """Records the rows inserted into a table, optionally failing"""
+
+    def __init__(self, attributes, fail=False):
+        self.heading = SimpleNamespace(names=attributes)
+        self.full_table_name = "`test`.`table`"
+        self.fail = fail
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def insert(self, rows, **kwargs):
+        if self.fail:
+            raise RuntimeError("insert failed")
+        self.rows.extend(rows)
+
+
+def test_incremental_ingest_manifest(tmp_path):
+    from workflow_array_ephys import ingest
+
+    csv_path = tmp_path / "subjects.csv"
+    csv_path.write_text("subject,sex\nsubject1,F\nsubject2,M,extra field\n")
+    manifest = ingest._IngestManifest(tmp_path / "ingest_manifest.sqlite")
+
+    with pytest.raises(RuntimeError):
+        ingest._ingest_csv_fan_out(
+            [csv_path], [_Table(["subject", "sex"], fail=True)], manifest=manifest
+        )
+    table = _Table(["subject", "sex"])
+    ingest._ingest_csv_fan_out([csv_path], [table], verbose=False, manifest=manifest)
+    assert [row["subject"] for row in table.rows] == ["subject1", "subject2"]
+
+    table = _Table(["subject", "sex"])
+    ingest._ingest_csv_fan_out([csv_path], [table], verbose=False, manifest=manifest)
+    assert table.rows == []
+
+    csv_path.write_text("subject,sex\nsubject1,M\nsubject2,M,extra field\n")
+    ingest._ingest_csv_fan_out([csv_path], [table], verbose=False, manifest=manifest)
+    assert table.rows == [{"subject": "subject1", "sex": "M"}]
+
+
+def test_project_rows():
+    from workflow_array_ephys import ingest
+
+    rows = [
+        {"lab": "LabA", "user": "Sherlock", "user_role": "PI"},
+        {"lab": "LabA", "user": "Watson", "user_role": "Dr"},
+        {"lab": "LabB", "user": "Pert", "user_role": "PI"},
+    ]
+
+    assert ingest._project_rows(rows, _Table(["lab", "lab_name"])) == [
+        {"lab": "LabA"},
+        {"lab": "LabB"},
+    ]
+    assert ingest._project_rows(rows, _Table(["user_role", "user"])) == [
+        {"user_role": "PI", "user": "Sherlock"},
+        {"user_role": "Dr", "user": "Watson"},
+        {"user_role": "PI", "user": "Pert"},
+    ]
+    assert ingest._project_rows([], _Table(["lab"])) == []
+
+
+def test_ingest_csv_streaming_batches(tmp_path):
+    from workflow_array_ephys import ingest
+
+    csv_path = tmp_path / "trials.csv"
+    csv_path.write_text(
+        "subject,trial_id,trial_type\n"
+        + "".join(f"subject1,{i},{'go' if i % 2 else 'nogo'}\n" for i in range(5))
+    )
+    trial_types, trials = _Table(["trial_type"]), _Table(["subject", "trial_id"])
+
+    ingest._ingest_csv_streaming(
+        csv_path, [trial_types, trials], batch_size=2, verbose=False
+    )
+
+    assert trial_types.rows == [
+        {"trial_type": "nogo"},
+        {"trial_type": "go"},
+        {"trial_type": "nogo"},
+        {"trial_type": "go"},
+        {"trial_type": "nogo"},
+    ]  # deduplicated within each batch only
+    assert [row["trial_id"] for row in trials.rows] == ["0", "1", "2", "3", "4"]
+
+
+@pytest.mark.parametrize(
+    "meta_lines, expected",
+    [
+        (
+            [
+                "typeEnabled=im,nidq",
+                "imProbeSN=1234",
+                "fileCreateTime=2020-01-01T10:00:00",
+                "fileCreateTime_original=2019-12-31T09:30:00",
+            ],
+            ("neuropixels 1.0 - 3A", 1234, datetime(2019, 12, 31, 9, 30)),
+        ),
+        (
+            [
+                "imDatPrb_type=0",
+                "typeImEnabled=1",
+                "imDatPrb_sn=18194814141",
+                "fileCreateTime=2021-06-01T12:00:00",
+            ],
+            ("neuropixels 1.0 - 3B", 18194814141, datetime(2021, 6, 1, 12)),
+        ),
+        (
+            [
+                "imDatPrb_type=24",
+                "imDatPrb_sn=19011116444",
+                "fileCreateTime=2022-02-02T02:02:02",
+                "~imroTbl=(24,384)(0 0 0 0 0)",
+            ],
+            ("neuropixels 2.0 - MS", 19011116444, datetime(2022, 2, 2, 2, 2, 2)),
+        ),
+    ],
+)
+def test_read_spikeglx_header(tmp_path, meta_lines, expected):
+    from workflow_array_ephys import ingest
+
+    meta_filepath = tmp_path / "probe_g0_t0.imec0.ap.meta"
+    meta_filepath.write_text("\n".join(meta_lines) + "\n")
+
+    spikeglx_header = ingest._read_spikeglx_header(meta_filepath)
+
+    assert (
+        spikeglx_header["probe_model"],
+        spikeglx_header["probe_SN"],
+        spikeglx_header["recording_time"],
+    ) == expected
+
+
+def test_read_spikeglx_header_reread_when_modified(tmp_path):
+    from workflow_array_ephys import ingest
+
+    meta_filepath = tmp_path / "probe_g0_t0.imec0.ap.meta"
+    meta_filepath.write_text("imProbeSN=1\nfileCreateTime=2020-01-01T10:00:00\n")
+    os.utime(meta_filepath, ns=(0, 1_000_000_000))
+    assert ingest._read_spikeglx_header(meta_filepath)["probe_SN"] == 1
+
+    meta_filepath.write_text("imProbeSN=2\nfileCreateTime=2020-01-01T10:00:00\n")
+    os.utime(meta_filepath, ns=(0, 2_000_000_000))
+    assert ingest._read_spikeglx_header(meta_filepath)["probe_SN"] == 2
+
+
+def test_read_spikeglx_header_matches_spikeglx_meta(pipeline, test_data):
+    from element_array_ephys.readers import spikeglx
+
+    from workflow_array_ephys import ingest
+
+    root_dirs = pipeline["get_ephys_root_data_dir"]()
+    root_dirs = root_dirs if isinstance(root_dirs, list) else [root_dirs]
+    meta_filepaths = [
+        meta_filepath
+        for root_dir in root_dirs
+        for meta_filepath in pathlib.Path(root_dir).rglob("*.ap.meta")
+    ]
+    assert meta_filepaths
+    for meta_filepath in meta_filepaths:
+        spikeglx_meta = spikeglx.SpikeGLXMeta(meta_filepath)
+        spikeglx_header = ingest._read_spikeglx_header(meta_filepath)
+
+        assert spikeglx_header == {
+            "probe_model": spikeglx_meta.probe_model,
+            "probe_SN": spikeglx_meta.probe_SN,
+            "recording_time": spikeglx_meta.recording_time,
+        }
+
+
+def _write_openephys_settings(settings_filepath, probe_serial_numbers):
+    """Write an OpenEphys settings file with one Neuropix-PXI processor"""
+    settings_filepath.parent.mkdir(parents=True, exist_ok=True)
+    settings_filepath.write_text(
+        "<SETTINGS><INFO><DATE>5 Mar 2021 14:20:05</DATE></INFO><SIGNALCHAIN>"
+        + '<PROCESSOR pluginName="Record Node"><EDITOR/></PROCESSOR>'
+        + '<PROCESSOR pluginName="Neuropix-PXI"><EDITOR>'
+        + "".join(
+            f'<NP_PROBE probe_serial_number="{probe_sn}" probe_name="{probe_name}"/>'
+            for probe_sn, probe_name in probe_serial_numbers
+        )
+        + "</EDITOR></PROCESSOR></SIGNALCHAIN></SETTINGS>"
+    )
+
+
+def test_read_openephys_header(tmp_path):
+    from workflow_array_ephys import ingest
+
+    _write_openephys_settings(
+        tmp_path / "experiment1" / "settings.xml",
+        [("17131311352", "Neuropixels 1.0"), ("19011119882", "Neuropixels 24")],
+    )
+    _write_openephys_settings(  # Record Node level, second experiment
+        tmp_path / "settings_2.xml", [("18005116362", "Neuropixels 21")]
+    )
+    (tmp_path / "experiment2" / "recording1").mkdir(parents=True)
+
+    first = ingest._read_openephys_header(tmp_path / "experiment1")
+    second = ingest._read_openephys_header(tmp_path / "experiment2" / "recording1")
+
+    assert first["datetime"] == datetime(2021, 3, 5, 14, 20, 5)
+    assert first["probes"] == [
+        {"probe_model": "neuropixels 1.0 - 3B", "probe_SN": "17131311352"},
+        {"probe_model": "neuropixels 2.0 - MS", "probe_SN": "19011119882"},
+    ]
+    assert second["probes"] == [
+        {"probe_model": "neuropixels 2.0 - SS", "probe_SN": "18005116362"}
+    ]
+    with pytest.raises(FileNotFoundError):
+        ingest._read_openephys_header(tmp_path / "experiment3")
+
+
+def test_read_openephys_header_matches_openephys(pipeline, test_data):
+    from element_array_ephys.readers import openephys
+
+    from workflow_array_ephys import ingest
+
+    session_dir = find_full_path(
+        pipeline["get_ephys_root_data_dir"](), "subject4/experiment1"
+    )
+    loaded_oe = openephys.OpenEphys(session_dir)
+
+    openephys_header = ingest._read_openephys_header(session_dir)
+
+    assert openephys_header["datetime"] == loaded_oe.experiment.datetime
+    assert openephys_header["probes"] == [
+        {"probe_model": oe_probe.probe_model, "probe_SN": oe_probe.probe_SN}
+        for oe_probe in loaded_oe.probes.values()
+    ]
@@ -0,0 +1,69 @@
+import datajoint as dj
+import numpy as np
+import pytest
+
+test_ccf_id = 99  # not used by the workflow's own CCF
+test_voxel_resolution = 10
+
+
+@pytest.fixture
+def localization(tmp_path, monkeypatch, pipeline):
+    """Load a small CCF from files in a temporary root data directory"""
+    import nrrd
+
+    from workflow_array_ephys import localization
+
+    volume = np.zeros((4, 3, 3), dtype=np.uint32)  # AP, DV, ML voxels
+    volume[2:] = 1
+    volume[:, 2] = 2
+    nrrd.write(str(tmp_path / f"annotation_{test_voxel_resolution}.nrrd"), volume)
+    (tmp_path / "query.csv").write_text(
+        "id,acronym,safe_name,color_hex_triplet\n"
+        + "997,root,root,FFFFFF\n"
+        + "8,grey,Basic cell groups and regions,BFDAE3\n"
+        + "567,CH,Cerebrum,B0F0FF\n"
+    )
+    monkeypatch.setitem(dj.config["custom"], "ephys_root_data_dir", str(tmp_path))
+    monkeypatch.setitem(dj.config["custom"], "ephys_processed_data_dir", str(tmp_path))
+    monkeypatch.setattr(localization, "ccf_id", test_ccf_id)
+    monkeypatch.setattr(localization, "voxel_resolution", test_voxel_resolution)
+    monkeypatch.setattr(localization, "_annotation_volumes", {})
+    localization.ensure_ccf_loaded()
+
+    yield localization
+
+    (localization.coordinate_framework.CCF & {"ccf_id": test_ccf_id}).delete()
+
+
+def test_electrode_brain_regions_numpy_matches_database(
+    localization, pipeline, ephys_recordings
+):
+    ephys, probe = pipeline["ephys"], pipeline["probe"]
+    electrode_localization = localization.electrode_localization
+    insertion_key = ephys.ProbeInsertion.fetch("KEY", limit=1)[0]
+    electrodes = (
+        probe.ProbeType.Electrode * ephys.ProbeInsertion & insertion_key
+    ).fetch("probe_type", "electrode", order_by="electrode", limit=50, as_dict=True)
+    voxels = (
+        localization.coordinate_framework.CCF.Voxel & {"ccf_id": test_ccf_id}
+    ).fetch("x", "y", "z", as_dict=True)
+
+    position_key = {**insertion_key, "ccf_id": test_ccf_id}
+    electrode_localization.ElectrodePosition.insert1(
+        position_key, allow_direct_insert=True
+    )
+    electrode_localization.ElectrodePosition.Electrode.insert(
+        [
+            {**position_key, **electrode, **voxels[i % len(voxels)]}
+            for i, electrode in enumerate(electrodes)
+        ],
+        allow_direct_insert=True,
+    )
+
+    brain_regions = localization.get_electrode_brain_regions(insertion_key)
+
+    assert len(brain_regions) == len(electrodes)
+    assert set(brain_regions.values()) == {"root", "grey", "c_h"}
+    assert brain_regions == localization.get_electrode_brain_regions(
+        insertion_key, method="database"
+    )
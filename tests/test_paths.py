@@ -0,0 +1,45 @@
+import datajoint as dj
+
+from workflow_array_ephys.paths import (
+    clear_path_cache,
+    find_full_path,
+    get_ephys_root_data_dir,
+    path_cache_info,
+)
+
+
+def test_find_full_path_cached(tmp_path):
+    (tmp_path / "subject1").mkdir()
+    clear_path_cache()
+
+    first = find_full_path(tmp_path, "subject1")
+    second = find_full_path(tmp_path, "subject1")
+
+    assert first == second == tmp_path / "subject1"
+    assert path_cache_info()["hits"] == 1
+    assert path_cache_info()["misses"] == 1
+
+
+def test_path_cache_invalidated_on_config_change(tmp_path, monkeypatch):
+    (tmp_path / "subject1").mkdir()
+    clear_path_cache()
+    monkeypatch.setitem(dj.config, "custom", {"ephys_root_data_dir": "/data"})
+    find_full_path(tmp_path, "subject1")
+
+    monkeypatch.setitem(dj.config, "custom", {"ephys_root_data_dir": "/other"})
+    find_full_path(tmp_path, "subject1")
+
+    assert path_cache_info()["misses"] == 2
+    assert path_cache_info()["full_path_size"] == 1
+
+
+def test_root_data_dirs_unavailable_last(tmp_path, monkeypatch):
+    (tmp_path / "local").mkdir()
+    missing = tmp_path / "archive"
+    monkeypatch.setitem(
+        dj.config,
+        "custom",
+        {"ephys_root_data_dir": [str(missing), str(tmp_path / "local")]},
+    )
+
+    assert get_ephys_root_data_dir() == [tmp_path / "local", missing]
@@ -0,0 +1,123 @@
+import pathlib
+
+import datajoint as dj
+import pytest
+
+from workflow_array_ephys.staging import RecordingStager
+
+
+class _MappedStager(RecordingStager):
+    """Stager looking up recording files from a dict instead of the database"""
+
+    meta_relpaths = {}
+
+    def get_meta_relpaths(self, keys):
+        return [self.meta_relpaths.get(key["insertion_number"]) for key in keys]
+
+
+def _write_recording(root_dir, probe_dir, n_bytes):
+    """Write the files of a SpikeGLX probe recording, returning its .ap.meta path"""
+    (root_dir / probe_dir).mkdir(parents=True, exist_ok=True)
+    prefix = pathlib.Path(probe_dir).name + "_t0.imec0"
+    for suffix in ("ap.bin", "lf.bin"):
+        (root_dir / probe_dir / f"{prefix}.{suffix}").write_bytes(b"0" * n_bytes)
+    for suffix in ("ap.meta", "lf.meta"):
+        (root_dir / probe_dir / f"{prefix}.{suffix}").write_text("imSampRate=30000\n")
+    return pathlib.Path(probe_dir) / f"{prefix}.ap.meta"
+
+
+@pytest.fixture
+def root_dir(tmp_path, monkeypatch):
+    root_dir = tmp_path / "root"
+    root_dir.mkdir()
+    monkeypatch.setitem(dj.config, "custom", {"ephys_root_data_dir": str(root_dir)})
+    return root_dir
+
+
+def test_stage_copies_recording(root_dir, tmp_path):
+    meta_relpath = _write_recording(root_dir, "subject1/session1/probe_g0", 100)
+    stager = RecordingStager(tmp_path / "staging", max_bytes=1000)
+
+    assert stager.stage(meta_relpath) == meta_relpath
+
+    staged_files = sorted(p.name for p in (tmp_path / "staging").rglob("*.*"))
+    source_files = sorted(p.name for p in (root_dir / meta_relpath.parent).iterdir())
+    assert staged_files == source_files
+    assert not list((tmp_path / "staging").rglob("*.partial"))
+
+
+def test_make_room_evicts_least_recently_used(root_dir, tmp_path):
+    first = _write_recording(root_dir, "subject1/session1/probe_g0", 200)
+    second = _write_recording(root_dir, "subject1/session2/probe_g0", 200)
+    third = _write_recording(root_dir, "subject1/session3/probe_g0", 200)
+    staging_dir = tmp_path / "staging"
+    stager = RecordingStager(staging_dir, max_bytes=900)
+
+    for meta_relpath in (first, second):
+        stager.release(stager.stage(meta_relpath))
+    stager.release(stager.stage(first))  # first is now the most recently used
+    stager.release(stager.stage(third))
+
+    assert (staging_dir / first).exists()
+    assert not (staging_dir / second).exists()
+    assert not list((staging_dir / second.parent).iterdir())
+    assert (staging_dir / third).exists()
+
+
+def test_pinned_recording_not_evicted(root_dir, tmp_path):
+    first = _write_recording(root_dir, "subject1/session1/probe_g0", 400)
+    second = _write_recording(root_dir, "subject1/session2/probe_g0", 400)
+    staging_dir = tmp_path / "staging"
+    stager = RecordingStager(staging_dir, max_bytes=1000)
+
+    stager.stage(first)  # pinned until released
+
+    assert stager.stage(second) is None
+    assert (staging_dir / first).exists()
+    assert not (staging_dir / second).exists()
+
+
+def test_changed_recording_removes_outdated_copy(root_dir, tmp_path):
+    meta_relpath = _write_recording(root_dir, "subject1/session1/probe_g0", 100)
+    staging_dir = tmp_path / "staging"
+    stager = RecordingStager(staging_dir, max_bytes=1000)
+    stager.release(stager.stage(meta_relpath))
+
+    lf_bin = meta_relpath.parent / meta_relpath.name.replace("ap.meta", "lf.bin")
+    (root_dir / lf_bin).unlink()
+    ap_bin = meta_relpath.with_suffix(".bin")
+    (root_dir / ap_bin).write_bytes(b"1" * 2000)
+
+    assert stager.stage(meta_relpath) is None
+    assert not list((staging_dir / meta_relpath.parent).iterdir())
+
+
+def test_restart_tracks_staged_recordings(root_dir, tmp_path):
+    meta_relpath = _write_recording(root_dir, "subject1/session1/probe_g0", 100)
+    staging_dir = tmp_path / "staging"
+    RecordingStager(staging_dir, max_bytes=1000).stage(meta_relpath)
+    (staging_dir / meta_relpath.parent / "interrupted.ap.bin.partial").touch()
+
+    stager = RecordingStager(staging_dir, max_bytes=1000)
+
+    assert meta_relpath in stager._staged
+    assert not list(staging_dir.rglob("*.partial"))
+
+
+def test_staged_yields_every_key_and_releases(root_dir, tmp_path):
+    _MappedStager.meta_relpaths = {
+        i: _write_recording(root_dir, f"subject1/session{i}/probe_g0", 100)
+        for i in range(3)
+    }
+    stager = _MappedStager(tmp_path / "staging", max_bytes=1000, prefetch=1)
+    keys = [{"insertion_number": i} for i in range(4)]  # key 3 is not SpikeGLX
+
+    yielded = []
+    for key in stager.staged(keys):
+        meta_relpath = _MappedStager.meta_relpaths.get(key["insertion_number"])
+        if meta_relpath is not None:
+            assert (tmp_path / "staging" / meta_relpath).exists()
+        yielded.append(key)
+
+    assert yielded == keys
+    assert not stager._pinned
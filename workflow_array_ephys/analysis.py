@@ -1,5 +1,7 @@
 import importlib
 import inspect
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 
 import datajoint as dj
 import matplotlib.pyplot as plt
@@ -41,6 +43,276 @@ def activate(
     )
 
 
+def _align_spikes(
+    spike_times: np.ndarray, event_times: np.ndarray, min_limit: float, max_limit: float
+) -> list:
+    """Align one unit's spike times to all event windows at once
+
+    Spikes are sorted once and each window [event - min_limit, event + max_limit) is
+    located with `np.searchsorted`, rather than masking every spike for every trial.
+    Spikes within a window keep their original order.
+
+    Args:
+        spike_times (np.ndarray): (s) spike times of one unit
+        event_times (np.ndarray): (s) alignment event time of each trial
+        min_limit (float): (s) duration of the window before the event
+        max_limit (float): (s) duration of the window after the event
+
+    Returns:
+        aligned_spikes (list): per trial, (s) spike times relative to the event time
+    """
+    spike_times = np.asarray(spike_times)
+    order = None
+    if np.any(spike_times[1:] < spike_times[:-1]):
+        order = np.argsort(spike_times, kind="stable")
+        sorted_spikes = spike_times[order]
+    else:
+        sorted_spikes = spike_times
+
+    window_starts = np.searchsorted(sorted_spikes, event_times - min_limit, side="left")
+    window_ends = np.searchsorted(sorted_spikes, event_times + max_limit, side="left")
+
+    aligned_spikes = []
+    for event_time, start, end in zip(
+        event_times.tolist(), window_starts.tolist(), window_ends.tolist()
+    ):
+        if order is None:
+            spikes = sorted_spikes[start:end]
+        else:
+            spikes = spike_times[np.sort(order[start:end])]
+        aligned_spikes.append(spikes - event_time)
+    return aligned_spikes
+
+
+def _get_trial_event_arrays(trialized_event_times) -> tuple:
+    """Convert trialized alignment event times to arrays, dropping trials without event
+
+    Args:
+        trialized_event_times (pandas.DataFrame): output of
+            trial.get_trialized_alignment_event_times, one row per trial
+
+    Returns:
+        trial_indices (np.ndarray): row index of each trial with an alignment event
+        event_times (np.ndarray): (s) alignment event time of each of these trials
+        start_times (np.ndarray): (s) window start time of each of these trials
+        end_times (np.ndarray): (s) window end time of each of these trials
+    """
+    event_times, start_times, end_times = (
+        trialized_event_times[column].to_numpy(dtype=float)
+        for column in ("event", "start", "end")
+    )
+    trial_indices = np.flatnonzero(~np.isnan(event_times))
+    return (
+        trial_indices,
+        event_times[trial_indices],
+        start_times[trial_indices],
+        end_times[trial_indices],
+    )
+
+
+def _get_window_limits(
+    event_times: np.ndarray, start_times: np.ndarray, end_times: np.ndarray
+) -> tuple:
+    """Return the widest alignment window around the event, over all trials
+
+    Args:
+        event_times (np.ndarray): (s) alignment event time of each trial
+        start_times (np.ndarray): (s) window start time of each trial
+        end_times (np.ndarray): (s) window end time of each trial
+
+    Returns:
+        min_limit (float): (s) duration of the window before the event
+        max_limit (float): (s) duration of the window after the event
+    """
+    return np.nanmax(event_times - start_times), np.nanmax(end_times - event_times)
+
+
+def _population_histogram(units_spikes: list, edges: np.ndarray) -> np.ndarray:
+    """Histogram the spikes of all units over the same uniform bins in one pass
+
+    Bin indices are computed arithmetically from the first edge and bin width,
+    then corrected against the edges themselves, so that counts are identical to
+    `np.histogram(spikes, bins=edges)` per unit: bins are closed on the left, the
+    last bin also on the right, and spikes outside the edges are dropped. Counts
+    of all units are accumulated with a single `np.bincount` over
+    unit * n_bins + bin.
+
+    Args:
+        units_spikes (list): per unit, spike times
+        edges (np.ndarray): uniformly spaced bin edges
+
+    Returns:
+        counts (np.ndarray): units x bins spike counts
+    """
+    n_units, n_bins = len(units_spikes), len(edges) - 1
+    if n_bins < 1:
+        return np.zeros((n_units, 0), dtype=np.int64)
+
+    spikes = np.concatenate([np.ravel(s) for s in units_spikes] or [np.array([])])
+    unit_indices = np.repeat(np.arange(n_units), [np.size(s) for s in units_spikes])
+    in_range = (spikes >= edges[0]) & (spikes <= edges[-1])
+    spikes, unit_indices = spikes[in_range], unit_indices[in_range]
+
+    bin_width = (edges[-1] - edges[0]) / n_bins
+    bins = np.clip(((spikes - edges[0]) / bin_width).astype(np.intp), 0, n_bins - 1)
+    bins[spikes < edges[bins]] -= 1
+    bins[(spikes >= edges[bins + 1]) & (bins < n_bins - 1)] += 1
+
+    return np.bincount(
+        unit_indices * n_bins + bins, minlength=n_units * n_bins
+    ).reshape(n_units, n_bins)
+
+
+def _trial_spike_counts(
+    units_aligned_spikes: list,
+    n_trials: int,
+    edges: np.ndarray,
+    max_chunk_size: int = 2**22,
+) -> np.ndarray:
+    """Bin the aligned spikes of all units and trials into a spike count cube
+
+    Units are histogrammed by `_population_histogram` in chunks of at most
+    max_chunk_size counts, copied into a uint16 cube that is widened to uint32
+    only if a count does not fit, so the int64 counts never span the whole cube.
+
+    Args:
+        units_aligned_spikes (list): per unit, per trial, aligned spike times
+        n_trials (int): number of trials of each unit
+        edges (np.ndarray): uniformly spaced bin edges
+        max_chunk_size (int, optional): maximum number of int64 counts computed at
+            once. Defaults to 2**22.
+
+    Returns:
+        spike_counts (np.ndarray): units x trials x bins spike counts
+    """
+    n_units, n_bins = len(units_aligned_spikes), max(len(edges) - 1, 0)
+    spike_counts = np.zeros((n_units, n_trials, n_bins), dtype=np.uint16)
+    units_per_chunk = max(1, max_chunk_size // max(n_trials * n_bins, 1))
+    for start in range(0, n_units, units_per_chunk):
+        chunk = units_aligned_spikes[start : start + units_per_chunk]
+        counts = _population_histogram(
+            [spikes for unit_spikes in chunk for spikes in unit_spikes], edges
+        ).reshape(len(chunk), n_trials, n_bins)
+        if counts.max(initial=0) > np.iinfo(spike_counts.dtype).max:
+            spike_counts = spike_counts.astype(np.uint32)
+        spike_counts[start : start + len(chunk)] = counts
+    return spike_counts
+
+
+def _smooth_psth(
+    psth: np.ndarray, bin_size: float, kernel: str, kernel_width: float
+) -> np.ndarray:
+    """Smooth PSTHs along their last (time) axis by FFT convolution
+
+    Args:
+        psth (np.ndarray): (spikes/s) PSTHs, bins along the last axis
+        bin_size (float): (s) bin size of the PSTHs
+        kernel (str): "none", "gaussian" (centered, kernel_width is the standard
+            deviation) or "causal" (exponential decay over past bins only,
+            kernel_width is the time constant)
+        kernel_width (float): (s) width of the kernel
+
+    Returns:
+        smoothed (np.ndarray): (spikes/s) smoothed PSTHs, same shape as psth
+    """
+    if kernel == "none" or not kernel_width:
+        return psth
+    if kernel == "gaussian":
+        half_width = int(np.ceil(4 * kernel_width / bin_size))
+        times = np.arange(-half_width, half_width + 1) * bin_size
+        weights = np.exp(-0.5 * (times / kernel_width) ** 2)
+        offset = half_width
+    elif kernel == "causal":
+        times = np.arange(int(np.ceil(5 * kernel_width / bin_size)) + 1) * bin_size
+        weights = np.exp(-times / kernel_width)
+        offset = 0
+    else:
+        raise ValueError(f"Unknown PSTH smoothing kernel: {kernel}")
+    weights /= weights.sum()
+
+    n_bins = psth.shape[-1]
+    n_fft = n_bins + len(weights) - 1
+    smoothed = np.fft.irfft(
+        np.fft.rfft(psth, n_fft, axis=-1) * np.fft.rfft(weights, n_fft), n_fft, axis=-1
+    )[..., offset : offset + n_bins]
+    return np.maximum(smoothed, 0)  # remove FFT round-off below zero
+
+
+def _bootstrap_psth_bands(
+    trial_counts: np.ndarray,
+    resample_weights: np.ndarray,
+    bin_size: float,
+    percentiles: tuple,
+) -> np.ndarray:
+    """Bootstrap percentiles of the PSTH of units from their trial spike counts
+
+    Each resample's PSTH is a weighted sum of trial counts, so all resamples of
+    all units are computed with one matrix product.
+
+    Args:
+        trial_counts (np.ndarray): units x trials x bins spike counts
+        resample_weights (np.ndarray): resamples x trials number of times each
+            trial is drawn in each resample
+        bin_size (float): (s) bin size
+        percentiles (tuple): lower and upper percentiles, in [0, 100]
+
+    Returns:
+        bands (np.ndarray): (spikes/s) units x 2 x bins lower and upper percentiles
+    """
+    n_trials = trial_counts.shape[1]
+    resampled_psth = (
+        np.matmul(resample_weights, trial_counts.astype(float)) / n_trials / bin_size
+    )
+    return np.percentile(resampled_psth, percentiles, axis=1).transpose(1, 0, 2)
+
+
+def _get_populate_errors(result) -> list:
+    """Return the (key, error) list of a DataJoint `populate` result
+
+    DataJoint 0.14.0 and 0.14.1 return the error list (or None), later versions a
+    dict with "success_count" and "error_list".
+
+    Args:
+        result (list | dict): Return value of `populate`
+
+    Returns:
+        error_list (list): (key, error) of failed keys
+    """
+    if isinstance(result, dict):
+        return result.get("error_list") or []
+    return result or []
+
+
+def _get_aligned_spikes_storage() -> str:
+    """Return the AlignedTrialSpikes storage layout from dj.config
+
+    Set dj.config["custom"]["spikes_alignment_storage"] to "ragged" to store one
+    AlignedUnitSpikes row per unit instead of one AlignedTrialSpikes row per
+    unit and trial. Default "trial".
+
+    Returns:
+        storage (str): either "trial" or "ragged"
+    """
+    storage = dj.config.get("custom", {}).get("spikes_alignment_storage", "trial")
+    if storage not in ("trial", "ragged"):
+        raise ValueError(f"Unknown spikes_alignment_storage: {storage}")
+    return storage
+
+
+def _split_ragged(values: np.ndarray, offsets: np.ndarray) -> list:
+    """Split flat values into per-trial arrays given trial offsets
+
+    Args:
+        values (np.ndarray): values of all trials, concatenated
+        offsets (np.ndarray): start index of each trial in values, followed by the
+            total length
+
+    Returns:
+        trials (list): per-trial arrays of values
+    """
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
 @schema
 class SpikesAlignmentCondition(dj.Manual):
     """Alignment activity table
@@ -98,6 +370,28 @@ class SpikesAlignment(dj.Computed):
         aligned_spike_times: longblob # (s) spike times relative to alignment event time
         """
 
+    class AlignedUnitSpikes(dj.Part):
+        """Compact (ragged) layout of AlignedTrialSpikes, one entry per unit
+
+        Attributes:
+            SpikesAlignment (foreign key): SpikesAlignment foreign key
+            ephys.CuratedClustering.Unit (foreign key): Unit foreign key
+            aligned_spike_times (longblob): (s) spike times relative to alignment
+                event, concatenated across trials
+            trial_offsets (longblob): start index of each trial in
+                aligned_spike_times, followed by the total number of spikes
+            trial_ids (longblob): trial_id of each trial
+        """
+
+        definition = """
+        -> master
+        -> ephys.CuratedClustering.Unit
+        ---
+        aligned_spike_times: longblob # (s) aligned spikes, concatenated across trials
+        trial_offsets: longblob  # start index of each trial, followed by total count
+        trial_ids: longblob  # trial_id of each trial
+        """
+
     class UnitPSTH(dj.Part):
         """Event-aligned spike peristimulus time histogram (PSTH) by unit
 
@@ -116,15 +410,60 @@ class SpikesAlignment(dj.Computed):
         psth_edges: longblob
         """
 
-    def make(self, key: dict):
-        """Populate SpikesAlignment, AlignedTrialSpikes and UnitPSTH
+    class PopulationPSTH(dj.Part):
+        """Event-aligned PSTH of all units as one units x bins matrix
+
+        Attributes:
+            SpikesAlignment (foreign key): SpikesAlignment foreign key
+            units (longblob): unit IDs, in the row order of population_psth
+            population_psth (longblob): (spikes/s) units x bins PSTH, each row equal
+                to the unit's UnitPSTH psth
+            psth_edges (longblob): set of PSTH edges
+        """
+
+        definition = """
+        -> master
+        ---
+        units: longblob  # unit IDs, in the row order of population_psth
+        population_psth: longblob  # (spikes/s) units x bins event-aligned PSTH
+        psth_edges: longblob
+        """
+
+    class TrialSpikeCounts(dj.Part):
+        """Event-aligned spike counts of every unit and trial, in the PSTH bins
+
+        Attributes:
+            SpikesAlignment (foreign key): SpikesAlignment foreign key
+            units (longblob): unit IDs, along the first axis of spike_counts
+            trial_ids (longblob): trial_id of each trial, along the second axis
+            spike_counts (longblob): units x trials x bins spike counts, uint16 or
+                uint32 if any count exceeds the uint16 range
+            psth_edges (longblob): set of PSTH edges
+        """
+
+        definition = """
+        -> master
+        ---
+        units: longblob  # unit IDs, along the first axis of spike_counts
+        trial_ids: longblob  # trial_id of each trial, along the second axis
+        spike_counts: longblob  # units x trials x bins spike counts
+        psth_edges: longblob
+        """
+
+    def make(self, key: dict, curation_units: tuple = None):
+        """Populate SpikesAlignment, its aligned spikes, PSTH and spike count tables
 
         Args:
             key (dict): Dict uniquely identifying one SpikesAlignmentCondition
+            curation_units (tuple, optional): Unit keys and spike times of the
+                key's ephys.CuratedClustering, ordered by unit. Default None, fetch
+                them from ephys.CuratedClustering.Unit.
         """
-        unit_keys, unit_spike_times = (
-            _linking_module.ephys.CuratedClustering.Unit & key
-        ).fetch("KEY", "spike_times", order_by="unit")
+        if curation_units is None:
+            curation_units = (_linking_module.ephys.CuratedClustering.Unit & key).fetch(
+                "KEY", "spike_times", order_by="unit"
+            )
+        unit_keys, unit_spike_times = curation_units
         bin_size = (SpikesAlignmentCondition & key).fetch1("bin_size")
 
         trialized_event_times = (
@@ -134,53 +473,154 @@ class SpikesAlignment(dj.Computed):
             )
         )
 
-        min_limit = (trialized_event_times.event - trialized_event_times.start).max()
-        max_limit = (trialized_event_times.end - trialized_event_times.event).max()
+        trial_indices, event_times, start_times, end_times = _get_trial_event_arrays(
+            trialized_event_times
+        )
+        if not len(event_times):
+            raise ValueError(f"No trial with an alignment event for {key}")
+        min_limit, max_limit = _get_window_limits(event_times, start_times, end_times)
+        trial_keys = trialized_event_times["trial_key"].iloc[trial_indices].tolist()
 
         # Spike raster
-        aligned_trial_spikes = []
-        units_spike_raster = {
-            u["unit"]: {**key, **u, "aligned_spikes": []} for u in unit_keys
-        }
-        for _, r in trialized_event_times.iterrows():
-            if np.isnan(r.event):
-                continue
-            alignment_start_time = r.event - min_limit
-            alignment_end_time = r.event + max_limit
-            for unit_key, spikes in zip(unit_keys, unit_spike_times):
-                aligned_spikes = (
-                    spikes[
-                        (alignment_start_time <= spikes) & (spikes < alignment_end_time)
-                    ]
-                    - r.event
-                )
-                aligned_trial_spikes.append(
-                    {
-                        **key,
-                        **unit_key,
-                        **r.trial_key,
-                        "aligned_spike_times": aligned_spikes,
-                    }
-                )
-                units_spike_raster[unit_key["unit"]]["aligned_spikes"].append(
-                    aligned_spikes
-                )
-
-        # PSTH
-        for unit_spike_raster in units_spike_raster.values():
-            spikes = np.concatenate(unit_spike_raster["aligned_spikes"])
-
-            psth, edges = np.histogram(
-                spikes, bins=np.arange(-min_limit, max_limit, bin_size)
-            )
-            unit_spike_raster["psth"] = (
-                psth / len(unit_spike_raster.pop("aligned_spikes")) / bin_size
-            )
-            unit_spike_raster["psth_edges"] = edges[1:]
+        units_aligned_spikes = [
+            _align_spikes(spikes, event_times, min_limit, max_limit)
+            for spikes in unit_spike_times
+        ]
+        trial_ids = np.array([k["trial_id"] for k in trial_keys])
+        if _get_aligned_spikes_storage() == "ragged":
+            aligned_unit_spikes = [
+                {
+                    **key,
+                    **unit_key,
+                    "aligned_spike_times": (
+                        np.concatenate(aligned_spikes)
+                        if aligned_spikes
+                        else np.array([])
+                    ),
+                    "trial_offsets": np.concatenate(
+                        [[0], np.cumsum([len(s) for s in aligned_spikes])]
+                    ).astype(np.int64),
+                    "trial_ids": trial_ids,
+                }
+                for unit_key, aligned_spikes in zip(unit_keys, units_aligned_spikes)
+            ]
+            aligned_trial_spikes = []
+        else:
+            aligned_trial_spikes = [
+                {
+                    **key,
+                    **unit_key,
+                    **trial_key,
+                    "aligned_spike_times": aligned_spikes[trial_idx],
+                }
+                for trial_idx, trial_key in enumerate(trial_keys)
+                for unit_key, aligned_spikes in zip(unit_keys, units_aligned_spikes)
+            ]
+            aligned_unit_spikes = []
+
+        # Spike counts per unit and trial, and PSTH
+        edges = np.arange(-min_limit, max_limit, bin_size)
+        spike_counts = _trial_spike_counts(
+            units_aligned_spikes, len(event_times), edges
+        )
+        population_psth = (
+            spike_counts.sum(axis=1, dtype=np.int64) / len(event_times) / bin_size
+        )
+        unit_psths = [
+            {**key, **unit_key, "psth": psth, "psth_edges": edges[1:]}
+            for unit_key, psth in zip(unit_keys, population_psth)
+        ]
 
         self.insert1(key)
         self.AlignedTrialSpikes.insert(aligned_trial_spikes)
-        self.UnitPSTH.insert(list(units_spike_raster.values()))
+        self.AlignedUnitSpikes.insert(aligned_unit_spikes)
+        self.UnitPSTH.insert(unit_psths)
+        self.PopulationPSTH.insert1(
+            {
+                **key,
+                "units": np.array([u["unit"] for u in unit_keys]),
+                "population_psth": population_psth,
+                "psth_edges": edges[1:],
+            }
+        )
+        self.TrialSpikeCounts.insert1(
+            {
+                **key,
+                "units": np.array([u["unit"] for u in unit_keys]),
+                "trial_ids": trial_ids,
+                "spike_counts": spike_counts,
+                "psth_edges": edges[1:],
+            }
+        )
+
+    def populate_by_curation(self, *restrictions, **populate_kwargs):
+        """Populate pending keys, fetching unit spike times once per curation
+
+        Pending SpikesAlignmentCondition keys are grouped by ephys.CuratedClustering.
+        The spike times of each curation are fetched once and passed to `make` for
+        every condition of that curation.
+
+        Args:
+            restrictions: Restrictions on key_source. See DataJoint `populate`.
+            populate_kwargs: Keyword arguments passed to DataJoint `populate`.
+
+        Returns:
+            error_list (list): (key, error) of failed keys when suppress_errors is
+                True, otherwise None
+        """
+        curated_clustering = _linking_module.ephys.CuratedClustering
+        pending = (self.key_source & dj.AndList(restrictions)) - self
+
+        error_list = []
+        for curation_key in (curated_clustering & pending).fetch("KEY"):
+            curation_units = (curated_clustering.Unit & curation_key).fetch(
+                "KEY", "spike_times", order_by="unit"
+            )
+            result = self.populate(
+                curation_key,
+                *restrictions,
+                make_kwargs={"curation_units": curation_units},
+                **populate_kwargs,
+            )
+            error_list.extend(_get_populate_errors(result))
+
+        if populate_kwargs.get("suppress_errors", False):
+            return error_list
+
+    def fetch_aligned_spikes(self, key: dict, unit: int = None) -> dict:
+        """Fetch event-aligned spikes per trial from either storage layout
+
+        Reads AlignedUnitSpikes (ragged) when present for this key, otherwise
+        AlignedTrialSpikes, and rebuilds the per-trial arrays.
+
+        Args:
+            key (dict): key of SpikesAlignment master table
+            unit (int, optional): ID of ephys.CuratedClustering.Unit table.
+                Default None, all units.
+
+        Returns:
+            aligned_spikes (dict): for each unit, a tuple of trial IDs and the list of
+                per-trial arrays of (s) spike times relative to the alignment event
+        """
+        unit_restriction = {} if unit is None else {"unit": unit}
+
+        ragged_query = self.AlignedUnitSpikes & key & unit_restriction
+        if ragged_query:
+            units, values, offsets, trial_ids = ragged_query.fetch(
+                "unit", "aligned_spike_times", "trial_offsets", "trial_ids"
+            )
+            return {
+                u: (t, _split_ragged(v, o))
+                for u, v, o, t in zip(units, values, offsets, trial_ids)
+            }
+
+        units, trial_ids, aligned_spikes = (
+            self.AlignedTrialSpikes & key & unit_restriction
+        ).fetch("unit", "trial_id", "aligned_spike_times", order_by="unit, trial_id")
+        return {
+            u: (trial_ids[units == u], list(aligned_spikes[units == u]))
+            for u in np.unique(units)
+        }
 
     def plot(self, key: dict, unit: int, axs: tuple = None) -> Figure:
         """Plot event-aligned and trial-averaged spiking
@@ -201,9 +641,7 @@ class SpikesAlignment(dj.Computed):
             fig, axs = plt.subplots(2, 1, figsize=(12, 8))
 
         bin_size = (SpikesAlignmentCondition & key).fetch1("bin_size")
-        trial_ids, aligned_spikes = (
-            self.AlignedTrialSpikes & key & {"unit": unit}
-        ).fetch("trial_id", "aligned_spike_times")
+        trial_ids, aligned_spikes = self.fetch_aligned_spikes(key, unit=unit)[unit]
         psth, psth_edges = (self.UnitPSTH & key & {"unit": unit}).fetch1(
             "psth", "psth_edges"
         )
@@ -220,3 +658,198 @@ class SpikesAlignment(dj.Computed):
         plot_psth._plot_psth(psth, psth_edges, bin_size, ax=axs[1], title="", xlim=xlim)
 
         return fig
+
+
+@schema
+class PSTHVariantParams(dj.Lookup):
+    """Bin size and smoothing kernel of PSTH variants
+
+    Attributes:
+        bin_size (decimal(6, 4)): (s) bin size
+        kernel (enum): smoothing kernel, "none", "gaussian" or "causal"
+        kernel_width (decimal(6, 4)): (s) standard deviation of the gaussian kernel,
+            or time constant of the causal exponential kernel
+    """
+
+    definition = """
+    bin_size: decimal(6, 4)  # (s) bin size
+    kernel: enum('none', 'gaussian', 'causal')  # smoothing kernel
+    kernel_width: decimal(6, 4)  # (s) gaussian sigma or causal time constant
+    """
+
+    contents = [
+        (0.005, "none", 0),
+        (0.01, "none", 0),
+        (0.05, "none", 0),
+        (0.1, "none", 0),
+        (0.2, "none", 0),
+        (0.005, "gaussian", 0.02),
+        (0.005, "causal", 0.02),
+    ]
+
+
+@schema
+class PSTHVariant(dj.Computed):
+    """PSTH of all units rebinned and smoothed from the stored aligned spikes
+
+    Attributes:
+        SpikesAlignment (foreign key): SpikesAlignment foreign key
+        PSTHVariantParams (foreign key): PSTHVariantParams foreign key
+        units (longblob): unit IDs, in the row order of population_psth
+        population_psth (longblob): (spikes/s) units x bins PSTH
+        psth_edges (longblob): set of PSTH edges
+    """
+
+    definition = """
+    -> SpikesAlignment
+    -> PSTHVariantParams
+    ---
+    units: longblob  # unit IDs, in the row order of population_psth
+    population_psth: longblob  # (spikes/s) units x bins event-aligned PSTH
+    psth_edges: longblob
+    """
+
+    def make(self, key: dict):
+        """Rebin and smooth the aligned spikes of a SpikesAlignment
+
+        Args:
+            key (dict): Dict uniquely identifying one SpikesAlignment and one
+                PSTHVariantParams
+        """
+        bin_size = float(key["bin_size"])
+        kernel, kernel_width = key["kernel"], float(key["kernel_width"])
+        alignment_key = (SpikesAlignment & key).fetch1("KEY")
+
+        trialized_event_times = (
+            _linking_module.trial.get_trialized_alignment_event_times(
+                alignment_key,
+                _linking_module.trial.Trial
+                & (SpikesAlignmentCondition.Trial & alignment_key),
+            )
+        )
+        min_limit, max_limit = _get_window_limits(
+            *_get_trial_event_arrays(trialized_event_times)[1:]
+        )
+        edges = np.arange(-min_limit, max_limit, bin_size)
+
+        aligned_spikes = SpikesAlignment().fetch_aligned_spikes(alignment_key)
+        units = sorted(aligned_spikes)
+        n_trials = len(aligned_spikes[units[0]][0]) if units else 0
+        counts = _population_histogram(
+            [
+                np.concatenate(aligned_spikes[unit][1] or [np.array([])])
+                for unit in units
+            ],
+            edges,
+        )
+        population_psth = _smooth_psth(
+            counts / max(n_trials, 1) / bin_size, bin_size, kernel, kernel_width
+        )
+
+        self.insert1(
+            {
+                **key,
+                "units": np.array(units),
+                "population_psth": population_psth,
+                "psth_edges": edges[1:],
+            }
+        )
+
+
+@schema
+class UnitPSTHBootstrap(dj.Computed):
+    """Trial-resampling bootstrap confidence bands of UnitPSTH
+
+    Attributes:
+        SpikesAlignment (foreign key): SpikesAlignment foreign key
+        n_resamples (int): number of bootstrap resamples
+        confidence (float): confidence level of the bands
+        seed (int): seed of the random generator drawing the resamples
+    """
+
+    definition = """
+    -> SpikesAlignment
+    ---
+    n_resamples: int  # number of bootstrap resamples
+    confidence: float  # confidence level of the bands
+    seed: int  # seed of the random generator drawing the resamples
+    """
+
+    class Unit(dj.Part):
+        """Bootstrap confidence band of one unit's PSTH
+
+        Attributes:
+            UnitPSTHBootstrap (foreign key): UnitPSTHBootstrap foreign key
+            SpikesAlignment.UnitPSTH (foreign key): UnitPSTH foreign key
+            psth_lower (longblob): (spikes/s) lower bound of the PSTH
+            psth_upper (longblob): (spikes/s) upper bound of the PSTH
+        """
+
+        definition = """
+        -> master
+        -> SpikesAlignment.UnitPSTH
+        ---
+        psth_lower: longblob  # (spikes/s) lower bound of the PSTH
+        psth_upper: longblob  # (spikes/s) upper bound of the PSTH
+        """
+
+    n_resamples = 1000
+    confidence = 0.95
+    seed = 0
+
+    @property
+    def key_source(self):
+        return SpikesAlignment & SpikesAlignment.TrialSpikeCounts
+
+    def make(self, key: dict, n_workers: int = 1):
+        """Resample trials to bound every unit's PSTH
+
+        The same resamples of trials, drawn from a generator seeded with `seed`,
+        are used for all units.
+
+        Args:
+            key (dict): Dict uniquely identifying one SpikesAlignment
+            n_workers (int, optional): Number of processes sharing the units, e.g.
+                populate(make_kwargs={"n_workers": 8}). Defaults to 1.
+        """
+        units, trial_ids, spike_counts = (
+            SpikesAlignment.TrialSpikeCounts & key
+        ).fetch1("units", "trial_ids", "spike_counts")
+        bin_size = (SpikesAlignmentCondition & key).fetch1("bin_size")
+
+        rng = np.random.default_rng(self.seed)
+        n_trials = len(trial_ids)
+        resample_weights = rng.multinomial(
+            n_trials, np.full(n_trials, 1 / n_trials), size=self.n_resamples
+        ).astype(float)
+        tail = 50 * (1 - self.confidence)
+        percentiles = (tail, 100 - tail)
+
+        unit_chunks = np.array_split(
+            np.arange(len(units)), max(1, int(np.ceil(len(units) / 32)))
+        )
+        chunk_args = [
+            (spike_counts[chunk], resample_weights, bin_size, percentiles)
+            for chunk in unit_chunks
+        ]
+        if n_workers > 1:
+            with ProcessPoolExecutor(
+                n_workers, mp_context=mp.get_context("spawn")
+            ) as executor:
+                bands = list(executor.map(_bootstrap_psth_bands, *zip(*chunk_args)))
+        else:
+            bands = [_bootstrap_psth_bands(*args) for args in chunk_args]
+        bands = np.concatenate(bands) if bands else np.zeros((0, 2, 0))
+
+        self.insert1(
+            {
+                **key,
+                "n_resamples": self.n_resamples,
+                "confidence": self.confidence,
+                "seed": self.seed,
+            }
+        )
+        self.Unit.insert(
+            {**key, "unit": unit, "psth_lower": lower, "psth_upper": upper}
+            for unit, (lower, upper) in zip(units.tolist(), bands)
+        )
@@ -1,15 +1,28 @@
 import csv
+import functools
+import hashlib
+import itertools
+import json
 import logging
+import os
+import pathlib
 import re
-
-from element_array_ephys.readers import openephys, spikeglx
-from element_interface.utils import (
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import datajoint as dj
+from element_array_ephys.readers.openephys import _probe_model_name_mapping
+from element_array_ephys.readers.utils import convert_to_number
+from element_interface.utils import find_root_directory
+
+from workflow_array_ephys.paths import (
     find_full_path,
-    find_root_directory,
-    ingest_csv_to_table,
+    get_ephys_root_data_dir,
+    get_processed_root_data_dir,
 )
-
-from workflow_array_ephys.paths import get_ephys_root_data_dir
 from workflow_array_ephys.pipeline import (
     ephys,
     event,
@@ -23,6 +36,135 @@ from workflow_array_ephys.pipeline import (
 
 logger = logging.getLogger("datajoint")
 
+# Acquisition software and the file pattern identifying its recordings, by priority
+_ephys_meta_patterns = {"SpikeGLX": "*.ap.meta", "OpenEphys": "*.oebin"}
+
+# SpikeGLX meta keys read by ingest_sessions, see spikeglx.SpikeGLXMeta
+_spikeglx_header_keys = (
+    "imDatPrb_type",
+    "typeEnabled",
+    "typeImEnabled",
+    "fileCreateTime",
+    "fileCreateTime_original",
+    "imProbeSN",
+    "imDatPrb_sn",
+)
+
+
+class _IngestManifest:
+    """Content hashes of csv rows already ingested, kept in a SQLite database
+
+    Rows are recorded per csv file and database (host and schema prefix), so
+    re-running an ingest only sends rows that are new or changed since last time.
+    Delete the manifest file to ingest everything again.
+
+    Args:
+        manifest_path (str): Path of the SQLite database file
+    """
+
+    def __init__(self, manifest_path: str):
+        self._connection = sqlite3.connect(manifest_path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS ingested_row "
+            + "(source TEXT, row_hash TEXT, PRIMARY KEY (source, row_hash))"
+        )
+
+    @staticmethod
+    def _source(csv_path: str) -> str:
+        """Identify a csv file ingested into the configured database"""
+        return "{}/{}:{}".format(
+            dj.config["database.host"],
+            dj.config.get("custom", {}).get("database.prefix", ""),
+            pathlib.Path(csv_path).resolve().as_posix(),
+        )
+
+    def new_rows(self, csv_path: str, rows: list) -> tuple:
+        """Return the rows not yet recorded for this csv, and their hashes
+
+        Args:
+            csv_path (str): Path of the csv the rows were read from
+            rows (list): csv rows, as dicts keyed by column name
+
+        Returns:
+            rows (list): Rows not yet recorded, in csv order
+            row_hashes (list): Content hash of each returned row
+        """
+        source = self._source(csv_path)
+        row_hashes = [
+            hashlib.sha1(json.dumps(_sorted_row_items(row)).encode()).hexdigest()
+            for row in rows
+        ]
+        recorded = set()
+        for chunk_start in range(0, len(row_hashes), 500):
+            chunk = row_hashes[chunk_start : chunk_start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            recorded.update(
+                r[0]
+                for r in self._connection.execute(
+                    "SELECT row_hash FROM ingested_row "
+                    + f"WHERE source = ? AND row_hash IN ({placeholders})",
+                    [source, *chunk],
+                )
+            )
+        if recorded:
+            logger.info(
+                f"---- Skipping {len(recorded)} row(s) already ingested "
+                + f"from {csv_path} ----"
+            )
+        new_rows = [
+            (row, row_hash)
+            for row, row_hash in zip(rows, row_hashes)
+            if row_hash not in recorded
+        ]
+        return [row for row, _ in new_rows], [row_hash for _, row_hash in new_rows]
+
+    def record(self, csv_path: str, row_hashes: list):
+        """Record rows of a csv as ingested
+
+        Args:
+            csv_path (str): Path of the csv the rows were read from
+            row_hashes (list): Content hashes, as returned by `new_rows`
+        """
+        source = self._source(csv_path)
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO ingested_row VALUES (?, ?)",
+                [(source, row_hash) for row_hash in row_hashes],
+            )
+
+
+def _sorted_row_items(row: dict) -> list:
+    """Return the items of a csv row sorted by column name, for hashing
+
+    csv.DictReader puts the fields of a row longer than the header under a None
+    key, which json.dumps(sort_keys=True) cannot sort with the column names.
+    """
+    return sorted(row.items(), key=lambda item: str(item[0]))
+
+
+def _open_ingest_manifest(incremental: bool):
+    """Open the ingest manifest in the processed data root directory
+
+    Args:
+        incremental (bool): Whether the ingest is incremental
+
+    Raises:
+        FileNotFoundError: incremental, but no processed data root directory is
+            configured
+
+    Returns:
+        manifest (_IngestManifest): The manifest, or None if not incremental
+    """
+    if not incremental:
+        return None
+    processed_root_dir = get_processed_root_data_dir()
+    if processed_root_dir is None:
+        raise FileNotFoundError(
+            "Incremental ingest keeps its manifest in the processed data root "
+            + "directory, but 'ephys_processed_data_dir' is not set in dj.config"
+        )
+    return _IngestManifest(processed_root_dir / "ingest_manifest.sqlite")
+
 
 def ingest_lab(
     lab_csv_path="./user_data/lab/labs.csv",
@@ -34,6 +176,7 @@ def ingest_lab(
     project_user_csv_path="./user_data/lab/project_users.csv",
     skip_duplicates=True,
     verbose=True,
+    incremental=False,
 ):
     """Inserts data from a CSVs into their corresponding lab schema tables.
 
@@ -49,6 +192,8 @@ def ingest_lab(
         project_user_csv_path (str): relative path of project users csv
         skip_duplicates=True (str): datajoint insert function param
         verbose (str): print number inserted (i.e., table length change)
+        incremental (bool): only insert csv rows not yet recorded in the ingest
+            manifest. See `_IngestManifest`.
     """
 
     # List with repeats for when multiple dj.tables fed by same CSV
@@ -85,8 +230,6 @@ def ingest_lab(
         lab.ProjectUser(),
     ]
 
-    ingest_csv_to_table(csvs, tables, skip_duplicates=skip_duplicates, verbose=verbose)
-
     # For project schema
     project_csvs = [
         project_csv_path,
@@ -104,15 +247,95 @@ def ingest_lab(
         project.ProjectSourceCode(),
     ]
 
-    ingest_csv_to_table(
-        project_csvs, project_tables, skip_duplicates=skip_duplicates, verbose=verbose
+    _ingest_csv_fan_out(
+        csvs + project_csvs,
+        tables + project_tables,
+        skip_duplicates=skip_duplicates,
+        verbose=verbose,
+        manifest=_open_ingest_manifest(incremental),
     )
 
 
+def _ingest_csv_fan_out(
+    csvs: list,
+    tables: list,
+    skip_duplicates: bool = True,
+    verbose: bool = True,
+    manifest=None,
+):
+    """Insert csv rows into their tables, reading each distinct csv only once
+
+    Same as `element_interface.utils.ingest_csv_to_table`, but rows of a csv that
+    feeds several tables are parsed once, cached, and deduplicated in memory for
+    each table before insert.
+
+    Args:
+        csvs (list): Relative paths of the csv feeding each table
+        tables (list): DataJoint tables, in insert order
+        skip_duplicates (bool, optional): See DataJoint `insert` function. Default True.
+        verbose (bool, optional): Print number inserted (i.e., table length change).
+            Defaults to True.
+        manifest (_IngestManifest, optional): When given, only rows not yet in the
+            manifest are inserted, and recorded once all tables are done.
+    """
+    csv_rows, csv_row_hashes = {}, {}
+    for csv_path, table in zip(csvs, tables):
+        if csv_path not in csv_rows:
+            csv_rows[csv_path] = _read_csv_rows(csv_path)
+            if manifest is not None:
+                csv_rows[csv_path], csv_row_hashes[csv_path] = manifest.new_rows(
+                    csv_path, csv_rows[csv_path]
+                )
+        if verbose:
+            prev_len = len(table)
+        table.insert(
+            _project_rows(csv_rows[csv_path], table), skip_duplicates=skip_duplicates
+        )
+        if verbose:
+            logger.info(
+                f"\n---- Inserting {len(table) - prev_len} entry(s) "
+                + f"into {table.full_table_name} ----"
+            )
+
+    for csv_path, row_hashes in csv_row_hashes.items():
+        manifest.record(csv_path, row_hashes)
+
+
+def _read_csv_rows(csv_path: str) -> list:
+    """Read all rows of a comma-delimited csv
+
+    Args:
+        csv_path (str): Relative path to the csv
+
+    Returns:
+        rows (list): One dict per row, keyed by column name
+    """
+    with open(csv_path, newline="") as f:
+        return list(csv.DictReader(f, delimiter=","))
+
+
+def _project_rows(rows: list, table) -> list:
+    """Project csv rows onto the attributes of a table, dropping duplicates
+
+    Args:
+        rows (list): csv rows, as dicts keyed by column name
+        table (dj.Table): DataJoint table
+
+    Returns:
+        rows (list): Unique rows with only the table's attributes, in csv order
+    """
+    if not rows:
+        return []
+    attributes = [a for a in table.heading.names if a in rows[0]]
+    unique_rows = dict.fromkeys(tuple(row[a] for a in attributes) for row in rows)
+    return [dict(zip(attributes, row)) for row in unique_rows]
+
+
 def ingest_subjects(
     subject_csv_path: str = "./user_data/subjects.csv",
     skip_duplicates: bool = True,
     verbose: bool = True,
+    incremental: bool = False,
 ):
     """Ingest subjects listed in the subject column of ./user_data/subjects.csv
 
@@ -122,23 +345,51 @@ def ingest_subjects(
         skip_duplicates (bool, optional): See DataJoint `insert` function. Default True.
         verbose (bool, optional): Print number inserted (i.e., table length change).
             Defaults to True.
+        incremental (bool, optional): Only insert csv rows not yet recorded in the
+            ingest manifest. See `_IngestManifest`. Defaults to False.
     """
     csvs = [subject_csv_path]
     tables = [subject.Subject()]
 
-    ingest_csv_to_table(csvs, tables, skip_duplicates=skip_duplicates, verbose=verbose)
+    _ingest_csv_fan_out(
+        csvs,
+        tables,
+        skip_duplicates=skip_duplicates,
+        verbose=verbose,
+        manifest=_open_ingest_manifest(incremental),
+    )
 
 
 def ingest_sessions(
-    session_csv_path: str = "./user_data/sessions.csv", verbose: bool = True, **_
+    session_csv_path: str = "./user_data/sessions.csv",
+    verbose: bool = True,
+    n_workers: int = 8,
+    discovery_index_path: str = None,
+    chunk_size: int = 1000,
+    incremental: bool = False,
+    **_,
 ):
     """Ingest SpikeGLX and OpenEphys files from directories listed in csv
 
+    Session directories are searched for recording files on a thread pool. With
+    discovery_index_path, the listing of each directory is kept in a discovery
+    index keyed by the directory modification time, so re-running on an unchanged
+    tree only checks mtimes.
+
     Args:
         session_csv_path (str, optional): List of sessions.
             Defaults to "./user_data/sessions.csv".
         verbose (bool, optional): Print number inserted (i.e., table length change).
             Defaults to True.
+        n_workers (int, optional): Number of threads searching session directories.
+            Defaults to 8.
+        discovery_index_path (str, optional): JSON file persisting the discovery
+            index. It keeps the directories visited by the last run only. Defaults
+            to None, no persistence.
+        chunk_size (int, optional): Number of sessions (or probes) inserted per
+            transaction. Defaults to 1000.
+        incremental (bool, optional): Only ingest csv rows not yet recorded in the
+            ingest manifest. See `_IngestManifest`. Defaults to False.
 
     Raises:
         FileNotFoundError: Neither SpikeGLX nor OpenEphys recording files found in dir
@@ -150,24 +401,55 @@ def ingest_sessions(
     with open(session_csv_path, newline="") as f:
         input_sessions = list(csv.DictReader(f, delimiter=","))
 
-    # Folder structure: root / subject / session / probe / .ap.meta
-    (session_list, session_dir_list) = ([], [])
-    session_note_list, session_experimenter_list, lab_user_list = [], [], []
-    probe_list, probe_insertion_list = [], []
+    manifest = _open_ingest_manifest(incremental)
+    if manifest is not None:
+        input_sessions, session_row_hashes = manifest.new_rows(
+            session_csv_path, input_sessions
+        )
+
+    previous_index = _load_discovery_index(discovery_index_path)
+    discovery_index = {}
 
-    for this_session in input_sessions:
-        session_dir = find_full_path(
-            get_ephys_root_data_dir(), this_session["session_dir"]
+    # Folder structure: root / subject / session / probe / .ap.meta
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        discovered_sessions = list(
+            executor.map(
+                lambda s: _discover_session(
+                    s["session_dir"], previous_index, discovery_index
+                ),
+                input_sessions,
+            )
         )
+
+    _save_discovery_index(discovery_index_path, discovery_index)
+
+    # Rows of each new session, per table in session_tables
+    session_tables = [
+        (session.Session(), {}),
+        (lab.User(), {"skip_duplicates": True}),
+        (session.SessionDirectory(), {}),
+        (session.SessionNote(), {}),
+        (session.SessionExperimenter(), {}),
+        (ephys.ProbeInsertion(), {}),
+    ]
+    session_row_groups, probe_list = [], []
+
+    # Prefetch existing keys once, check them in memory
+    existing_probes = {
+        (probe_type, str(probe_sn))
+        for probe_type, probe_sn in zip(*probe.Probe.fetch("probe_type", "probe"))
+    }
+    existing_sessions = set(zip(*session.Session.fetch("subject", "session_datetime")))
+    listed_probes = set()
+
+    for this_session, (session_dir, ephys_meta_files) in zip(
+        input_sessions, discovered_sessions
+    ):
         session_datetimes, insertions = [], []
 
-        # search session dir and determine acquisition software
-        for ephys_pattern, ephys_acq_type in zip(
-            ["*.ap.meta", "*.oebin"], ["SpikeGLX", "OpenEphys"]
-        ):
-            ephys_meta_filepaths = [fp for fp in session_dir.rglob(ephys_pattern)]
+        # determine acquisition software
+        for acq_software, ephys_meta_filepaths in ephys_meta_files.items():
             if len(ephys_meta_filepaths):
-                acq_software = ephys_acq_type
                 break
         else:
             raise FileNotFoundError(
@@ -178,17 +460,19 @@ def ingest_sessions(
 
         if acq_software == "SpikeGLX":
             for meta_filepath in ephys_meta_filepaths:
-                spikeglx_meta = spikeglx.SpikeGLXMeta(meta_filepath)
+                spikeglx_header = _read_spikeglx_header(meta_filepath)
 
                 probe_key = {
-                    "probe_type": spikeglx_meta.probe_model,
-                    "probe": spikeglx_meta.probe_SN,
+                    "probe_type": spikeglx_header["probe_model"],
+                    "probe": spikeglx_header["probe_SN"],
                 }
                 if (
-                    probe_key["probe"] not in [p["probe"] for p in probe_list]
-                    and probe_key not in probe.Probe()
+                    probe_key["probe"] not in listed_probes
+                    and (probe_key["probe_type"], str(probe_key["probe"]))
+                    not in existing_probes
                 ):
                     probe_list.append(probe_key)
+                    listed_probes.add(probe_key["probe"])
 
                 probe_dir = meta_filepath.parent
                 probe_number = re.search("(imec)?\d{1}$", probe_dir.name).group()
@@ -196,26 +480,28 @@ def ingest_sessions(
 
                 insertions.append(
                     {
-                        "probe": spikeglx_meta.probe_SN,
+                        "probe": spikeglx_header["probe_SN"],
                         "insertion_number": int(probe_number),
                     }
                 )
-                session_datetimes.append(spikeglx_meta.recording_time)
+                session_datetimes.append(spikeglx_header["recording_time"])
         elif acq_software == "OpenEphys":
-            loaded_oe = openephys.OpenEphys(session_dir)
-            session_datetimes.append(loaded_oe.experiment.datetime)
-            for probe_idx, oe_probe in enumerate(loaded_oe.probes.values()):
+            openephys_header = _read_openephys_header(session_dir)
+            session_datetimes.append(openephys_header["datetime"])
+            for probe_idx, oe_probe in enumerate(openephys_header["probes"]):
                 probe_key = {
-                    "probe_type": oe_probe.probe_model,
-                    "probe": oe_probe.probe_SN,
+                    "probe_type": oe_probe["probe_model"],
+                    "probe": oe_probe["probe_SN"],
                 }
                 if (
-                    probe_key["probe"] not in [p["probe"] for p in probe_list]
-                    and probe_key not in probe.Probe()
+                    probe_key["probe"] not in listed_probes
+                    and (probe_key["probe_type"], str(probe_key["probe"]))
+                    not in existing_probes
                 ):
                     probe_list.append(probe_key)
+                    listed_probes.add(probe_key["probe"])
                 insertions.append(
-                    {"probe": oe_probe.probe_SN, "insertion_number": probe_idx}
+                    {"probe": oe_probe["probe_SN"], "insertion_number": probe_idx}
                 )
         else:
             raise NotImplementedError(
@@ -227,47 +513,300 @@ def ingest_sessions(
             "subject": this_session["subject"],
             "session_datetime": min(session_datetimes),
         }
-        if session_key not in session.Session():
-            session_list.append(session_key)
+        if (session_key["subject"], session_key["session_datetime"]) not in (
+            existing_sessions
+        ):
             root_dir = find_root_directory(get_ephys_root_data_dir(), session_dir)
-            session_dir_list.append(
-                {
-                    **session_key,
-                    "session_dir": session_dir.relative_to(root_dir).as_posix(),
-                }
-            )
-            session_note_list.append(
-                {**session_key, "session_note": this_session["session_note"]}
-            )
-            session_experimenter_list.append(
-                {**session_key, "user": this_session["user"]}
-            )
-            lab_user_list.append(
-                (this_session["user"], "", "", "")
-            )  # empty email/phone/name
-            probe_insertion_list.extend(
-                [{**session_key, **insertion} for insertion in insertions]
+            session_row_groups.append(
+                [
+                    [session_key],
+                    [(this_session["user"], "", "", "")],  # empty email/phone/name
+                    [
+                        {
+                            **session_key,
+                            "session_dir": session_dir.relative_to(root_dir).as_posix(),
+                        }
+                    ],
+                    [{**session_key, "session_note": this_session["session_note"]}],
+                    [{**session_key, "user": this_session["user"]}],
+                    [{**session_key, **insertion} for insertion in insertions],
+                ]
             )
 
-    session.Session.insert(session_list)
-    lab.User.insert(lab_user_list, skip_duplicates=True)
-    session.SessionDirectory.insert(session_dir_list)
-    session.SessionNote.insert(session_note_list)
-    session.SessionExperimenter.insert(session_experimenter_list)
+    _insert_in_chunks(
+        [(probe.Probe(), {})], [[[p]] for p in probe_list], chunk_size, verbose
+    )
+    _insert_in_chunks(session_tables, session_row_groups, chunk_size, verbose)
 
-    log_string = "---- Inserting %d entry(s) into %s ----"
+    if manifest is not None:
+        manifest.record(session_csv_path, session_row_hashes)
 
     if verbose:
-        logger.info(log_string % (len(session_list), "session.Session"))
+        logger.info("---- Successfully completed ingest_subjects ----")
 
-    probe.Probe.insert(probe_list)
-    if verbose:
-        logger.info(log_string % (len(probe_list), "probe.Probe"))
 
-    ephys.ProbeInsertion.insert(probe_insertion_list)
+def _insert_in_chunks(
+    tables: list, row_groups: list, chunk_size: int, verbose: bool = True
+):
+    """Insert groups of rows into several tables, chunk_size groups per transaction
+
+    A group holds the rows of one entity (e.g. one session) for every table, so a
+    failure rolls back whole entities and never leaves partial ones behind.
+
+    Args:
+        tables (list): (table, insert keyword arguments) in insert order
+        row_groups (list): Per group, a list of rows for each table
+        chunk_size (int): Number of groups inserted per transaction
+        verbose (bool, optional): Log rows inserted and rows/s for each table.
+            Defaults to True.
+    """
+    row_counts, insert_times = [0] * len(tables), [0.0] * len(tables)
+    connection = tables[0][0].connection
+    for chunk_start in range(0, len(row_groups), chunk_size):
+        chunk = row_groups[chunk_start : chunk_start + chunk_size]
+        with connection.transaction:
+            for table_idx, (table, insert_kwargs) in enumerate(tables):
+                rows = [row for group in chunk for row in group[table_idx]]
+                start_time = time.time()
+                table.insert(rows, **insert_kwargs)
+                insert_times[table_idx] += time.time() - start_time
+                row_counts[table_idx] += len(rows)
+
     if verbose:
-        logger.info(log_string % (len(probe_insertion_list), "ephys.ProbeInsertion"))
-        logger.info("---- Successfully completed ingest_subjects ----")
+        for (table, _), row_count, insert_time in zip(tables, row_counts, insert_times):
+            logger.info(
+                "---- Inserting %d entry(s) into %s (%.0f rows/s) ----"
+                % (
+                    row_count,
+                    table.full_table_name,
+                    row_count / insert_time if insert_time else 0,
+                )
+            )
+
+
+def _read_spikeglx_header(meta_filepath: pathlib.Path) -> dict:
+    """Read probe model, serial number and recording time from a SpikeGLX meta file
+
+    Lightweight alternative to spikeglx.SpikeGLXMeta for ingest, which skips the
+    channel map and imro table. Results are cached by file path and mtime.
+
+    Args:
+        meta_filepath (pathlib.Path): Path to the *.ap.meta file
+
+    Returns:
+        spikeglx_header (dict): probe_model, probe_SN and recording_time, as
+            defined by spikeglx.SpikeGLXMeta
+    """
+    meta_filepath = pathlib.Path(meta_filepath)
+    return _parse_spikeglx_header(
+        meta_filepath.as_posix(), meta_filepath.stat().st_mtime_ns
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_spikeglx_header(meta_filepath: str, mtime_ns: int) -> dict:
+    """Parse the SpikeGLX meta keys needed by ingest. See _read_spikeglx_header.
+
+    Args:
+        meta_filepath (str): Path to the *.ap.meta file
+        mtime_ns (int): Modification time of the file, part of the cache key
+
+    Returns:
+        spikeglx_header (dict): probe_model, probe_SN and recording_time
+    """
+    meta = {}
+    with open(meta_filepath) as f:
+        for line in f:
+            key, sep, value = line.rstrip().partition("=")
+            if sep and key in _spikeglx_header_keys:
+                meta[key] = convert_to_number(value)
+
+    probe_model = meta.get("imDatPrb_type", 1)
+    if probe_model <= 1:
+        if "typeEnabled" in meta:
+            probe_model = "neuropixels 1.0 - 3A"
+        elif "typeImEnabled" in meta:
+            probe_model = "neuropixels 1.0 - 3B"
+    elif probe_model == 1100:
+        probe_model = "neuropixels UHD"
+    elif probe_model == 21:
+        probe_model = "neuropixels 2.0 - SS"
+    elif probe_model == 24:
+        probe_model = "neuropixels 2.0 - MS"
+    else:
+        probe_model = str(probe_model)
+
+    return {
+        "probe_model": probe_model,
+        "probe_SN": meta.get("imProbeSN", meta.get("imDatPrb_sn")),
+        "recording_time": datetime.strptime(
+            meta.get("fileCreateTime_original", meta["fileCreateTime"]),
+            "%Y-%m-%dT%H:%M:%S",
+        ),
+    }
+
+
+def _read_openephys_header(session_dir: pathlib.Path) -> dict:
+    """Read experiment datetime and probes of an OpenEphys session from settings.xml
+
+    Lightweight alternative to openephys.OpenEphys for ingest, which does not walk
+    the recordings or load continuous data. Follows the settings file lookup of
+    pyopenephys and the probe identification of openephys.OpenEphys.
+
+    Args:
+        session_dir (pathlib.Path): OpenEphys experiment (or recording) directory
+
+    Raises:
+        FileNotFoundError: No unique settings file found for the experiment
+
+    Returns:
+        openephys_header (dict): datetime of the experiment and list of probes, each
+            a dict of probe_model and probe_SN, in the order of openephys.OpenEphys
+    """
+    session_dir = pathlib.Path(session_dir)
+    experiment_dir = (
+        session_dir.parent if session_dir.name.startswith("recording") else session_dir
+    )
+    if (experiment_dir / "settings.xml").exists():
+        settings_filepaths = [experiment_dir / "settings.xml"]
+    else:  # settings at the Record Node level, one per experiment
+        experiment_id = re.search(r"\d+$", experiment_dir.name)
+        experiment_id = int(experiment_id.group()) if experiment_id else 1
+        settings_filepaths = [
+            fp
+            for fp in experiment_dir.parent.glob("settings*.xml")
+            if (
+                fp.name == "settings.xml"
+                if experiment_id == 1
+                else str(experiment_id) in fp.name
+            )
+        ]
+    if len(settings_filepaths) != 1:
+        raise FileNotFoundError(f"Unique settings file not found for {session_dir}")
+
+    settings = ET.parse(settings_filepaths[0]).getroot()
+    experiment_datetime = datetime.strptime(
+        settings.find("INFO/DATE").text, "%d %b %Y %H:%M:%S"
+    )
+
+    probes = {}
+    for processor in settings.iterfind("SIGNALCHAIN/PROCESSOR"):
+        plugin_name = processor.get("pluginName")
+        if plugin_name not in ("Neuropix-3a", "Neuropix-PXI"):
+            continue
+        editor = processor.find("EDITOR")
+        if plugin_name == "Neuropix-3a" or editor.find("NP_PROBE") is None:
+            for probe_info in editor.iterfind("PROBE"):
+                probe_sn = probe_info.get("probe_serial_number")
+                probes[probe_sn] = _probe_model_name_mapping[plugin_name]
+        else:
+            for probe_info in editor.iterfind("NP_PROBE"):
+                probe_sn = probe_info.get("probe_serial_number")
+                probes[probe_sn] = _probe_model_name_mapping[
+                    probe_info.get("probe_name")
+                ]
+
+    return {
+        "datetime": experiment_datetime,
+        "probes": [
+            {"probe_model": probe_model, "probe_SN": probe_sn}
+            for probe_sn, probe_model in probes.items()
+        ],
+    }
+
+
+def _discover_session(
+    session_dir: str, previous_index: dict, discovery_index: dict
+) -> tuple:
+    """Find the full session directory and its recording meta files
+
+    Args:
+        session_dir (str): Session directory, relative to an ephys root directory
+        previous_index (dict): Discovery index of the previous run
+        discovery_index (dict): Discovery index of this run, updated in place
+
+    Returns:
+        session_dir (pathlib.Path): Full session directory
+        ephys_meta_files (dict): For each acquisition software, the list of meta
+            files matching its pattern
+    """
+    session_dir = find_full_path(get_ephys_root_data_dir(), session_dir)
+    filepaths = _find_files_cached(session_dir, previous_index, discovery_index)
+    return session_dir, {
+        acq_software: sorted(fp for fp in filepaths if fp.match(pattern))
+        for acq_software, pattern in _ephys_meta_patterns.items()
+    }
+
+
+def _find_files_cached(
+    directory: pathlib.Path, previous_index: dict, discovery_index: dict
+) -> list:
+    """Recursively find recording meta files, listing only modified directories
+
+    Each visited directory's matching files and subdirectories are stored in the
+    discovery index under its modification time. Directories whose mtime is
+    unchanged since the previous index are not listed again. Directories that are
+    no longer visited, e.g. removed ones, are left out of the new index.
+
+    Args:
+        directory (pathlib.Path): Directory to search
+        previous_index (dict): Discovery index of the previous run
+        discovery_index (dict): Discovery index of this run, updated in place
+
+    Returns:
+        filepaths (list): Files matching any of the recording meta patterns
+    """
+    filepaths, directories = [], [directory]
+    while directories:
+        directory = directories.pop()
+        mtime = directory.stat().st_mtime_ns
+        entry = previous_index.get(directory.as_posix())
+        if entry is None or entry["mtime"] != mtime:
+            entry = {"mtime": mtime, "files": [], "subdirs": []}
+            with os.scandir(directory) as dir_entries:
+                for dir_entry in dir_entries:
+                    if dir_entry.is_dir() and not dir_entry.is_symlink():
+                        entry["subdirs"].append(dir_entry.name)
+                    elif any(
+                        pathlib.PurePath(dir_entry.name).match(pattern)
+                        for pattern in _ephys_meta_patterns.values()
+                    ):
+                        entry["files"].append(dir_entry.name)
+        discovery_index[directory.as_posix()] = entry
+        filepaths.extend(directory / name for name in entry["files"])
+        directories.extend(directory / name for name in entry["subdirs"])
+    return filepaths
+
+
+def _load_discovery_index(discovery_index_path: str) -> dict:
+    """Load the discovery index, or start an empty one
+
+    Args:
+        discovery_index_path (str): JSON file of the index, or None
+
+    Returns:
+        discovery_index (dict): Directory listings keyed by directory path
+    """
+    if discovery_index_path is None or not pathlib.Path(discovery_index_path).exists():
+        return {}
+    with open(discovery_index_path) as f:
+        return json.load(f)
+
+
+def _save_discovery_index(discovery_index_path: str, discovery_index: dict):
+    """Write the discovery index, replacing the previous file atomically
+
+    Args:
+        discovery_index_path (str): JSON file of the index, or None to skip
+        discovery_index (dict): Directory listings keyed by directory path
+    """
+    if discovery_index_path is None:
+        return
+    discovery_index_path = pathlib.Path(discovery_index_path)
+    tmp_path = discovery_index_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(discovery_index, f)
+    os.replace(tmp_path, discovery_index_path)
 
 
 def ingest_events(
@@ -277,6 +816,8 @@ def ingest_events(
     event_csv_path: str = "./user_data/events.csv",
     skip_duplicates: bool = True,
     verbose: bool = True,
+    batch_size: int = 10000,
+    incremental: bool = False,
 ):
     """Ingest each level of experiment hierarchy for element-trial
 
@@ -298,48 +839,107 @@ def ingest_events(
         skip_duplicates (bool, optional): See DataJoint `insert` function. Default True.
         verbose (bool, optional): Print number inserted (i.e., table length change).
             Defaults to True.
+        batch_size (int, optional): Number of csv rows inserted at a time. Each csv
+            is read once and each batch inserted into every table it feeds.
+            Defaults to 10000.
+        incremental (bool, optional): Only insert csv rows not yet recorded in the
+            ingest manifest. See `_IngestManifest`. Defaults to False.
     """
-    csvs = [
-        recording_csv_path,
-        recording_csv_path,
-        block_csv_path,
-        block_csv_path,
-        trial_csv_path,
-        trial_csv_path,
-        trial_csv_path,
-        trial_csv_path,
-        event_csv_path,
-        event_csv_path,
-        event_csv_path,
-    ]
-    tables = [
-        event.BehaviorRecording(),
-        event.BehaviorRecording.File(),
-        trial.Block(),
-        trial.Block.Attribute(),
-        trial.TrialType(),
-        trial.Trial(),
-        trial.Trial.Attribute(),
-        trial.BlockTrial(),
-        event.EventType(),
-        event.Event(),
-        trial.TrialEvent(),
+    csv_tables = [
+        (
+            recording_csv_path,
+            [event.BehaviorRecording(), event.BehaviorRecording.File()],
+        ),
+        (block_csv_path, [trial.Block(), trial.Block.Attribute()]),
+        (
+            trial_csv_path,
+            [
+                trial.TrialType(),
+                trial.Trial(),
+                trial.Trial.Attribute(),
+                trial.BlockTrial(),
+            ],
+        ),
+        (event_csv_path, [event.EventType(), event.Event(), trial.TrialEvent()]),
     ]
 
+    manifest = _open_ingest_manifest(incremental)
+
     # Allow direct insert required because element-event has Imported that should be Manual
-    ingest_csv_to_table(
-        csvs,
-        tables,
-        skip_duplicates=skip_duplicates,
-        verbose=verbose,
-        allow_direct_insert=True,
-    )
+    for csv_path, tables in csv_tables:
+        _ingest_csv_streaming(
+            csv_path,
+            tables,
+            batch_size=batch_size,
+            skip_duplicates=skip_duplicates,
+            verbose=verbose,
+            allow_direct_insert=True,
+            manifest=manifest,
+        )
+
+
+def _ingest_csv_streaming(
+    csv_path: str,
+    tables: list,
+    batch_size: int = None,
+    skip_duplicates: bool = True,
+    verbose: bool = True,
+    allow_direct_insert: bool = False,
+    manifest=None,
+):
+    """Read a CSV once and insert each batch of rows into every table it feeds
+
+    Rows are projected onto each table's attributes and deduplicated within the
+    batch before insert, so memory is bounded by the batch size.
+
+    Args:
+        csv_path (str): Relative path to the csv
+        tables (list): DataJoint tables fed by the csv, in insert order
+        batch_size (int, optional): Number of csv rows per batch. Defaults to None,
+            the whole file in one batch.
+        skip_duplicates (bool, optional): See DataJoint `insert` function. Default True.
+        verbose (bool, optional): Print number inserted (i.e., table length change).
+            Defaults to True.
+        allow_direct_insert (bool, optional): See DataJoint `insert` function.
+            Default False.
+        manifest (_IngestManifest, optional): When given, only rows not yet in the
+            manifest are inserted, and recorded after each batch.
+    """
+    if verbose:
+        prev_lens = [len(table) for table in tables]
+
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f, delimiter=",")
+        while True:
+            batch = list(itertools.islice(reader, batch_size))
+            if not batch:
+                break
+            if manifest is not None:
+                batch, row_hashes = manifest.new_rows(csv_path, batch)
+            for table in tables:
+                table.insert(
+                    _project_rows(batch, table),
+                    skip_duplicates=skip_duplicates,
+                    allow_direct_insert=allow_direct_insert,
+                )
+            if manifest is not None:
+                manifest.record(csv_path, row_hashes)
+            if batch_size is None:
+                break
+
+    if verbose:
+        for table, prev_len in zip(tables, prev_lens):
+            logger.info(
+                f"\n---- Inserting {len(table) - prev_len} entry(s) "
+                + f"into {table.full_table_name} ----"
+            )
 
 
 def ingest_alignment(
     alignment_csv_path: str = "./user_data/alignments.csv",
     skip_duplicates: bool = True,
     verbose: bool = True,
+    incremental: bool = False,
 ):
     """Ingest event alignment data from local CSVs
 
@@ -351,12 +951,20 @@ def ingest_alignment(
         skip_duplicates (bool, optional): See DataJoint `insert` function. Default True.
         verbose (bool, optional): Print number inserted (i.e., table length change).
             Defaults to True.
+        incremental (bool, optional): Only insert csv rows not yet recorded in the
+            ingest manifest. See `_IngestManifest`. Defaults to False.
     """
 
     csvs = [alignment_csv_path]
     tables = [event.AlignmentEvent()]
 
-    ingest_csv_to_table(csvs, tables, skip_duplicates=skip_duplicates, verbose=verbose)
+    _ingest_csv_fan_out(
+        csvs,
+        tables,
+        skip_duplicates=skip_duplicates,
+        verbose=verbose,
+        manifest=_open_ingest_manifest(incremental),
+    )
 
 
 if __name__ == "__main__":
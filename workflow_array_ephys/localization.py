@@ -1,19 +1,29 @@
 """Load CCF files.
 
-When imported, checks to see that CCF (nrrd and query.csv) files in the
-ephys_root_data_dir have been loaded into
-element_electrode_localization.coordinate_framework. Default voxel resolution is 100.
+CCF (nrrd and query.csv) files in the ephys_root_data_dir are loaded into
+element_electrode_localization.coordinate_framework on first use, by
+`ensure_ccf_loaded`, rather than on import. Populate electrode positions with
+`populate_electrode_positions`, which loads the CCF first; ElectrodePosition has
+nothing to populate until it is loaded. Default voxel resolution is 100.
 To load other resolutions, please modify this script.
 """
 
+import csv
+import functools
+import logging
+import os
+import pathlib
+
 import datajoint as dj
+import numpy as np
 from element_electrode_localization import coordinate_framework, electrode_localization
 from element_electrode_localization.coordinate_framework import load_ccf_annotation
-from element_interface.utils import find_full_path
 
 from .paths import (
+    find_full_path,
     get_electrode_localization_dir,
     get_ephys_root_data_dir,
+    get_processed_root_data_dir,
     get_session_directory,
 )
 from .pipeline import ephys, probe
@@ -23,6 +33,8 @@ if "custom" not in dj.config:
 
 db_prefix = dj.config["custom"].get("database.prefix", "")
 
+logger = logging.getLogger("datajoint")
+
 __all__ = [
     "ephys",
     "probe",
@@ -33,6 +45,10 @@ __all__ = [
     "get_session_directory",
     "get_electrode_localization_dir",
     "load_ccf_annotation",
+    "ensure_ccf_loaded",
+    "populate_electrode_positions",
+    "get_annotation_volume",
+    "get_electrode_brain_regions",
 ]
 
 ccf_id = 0  # Atlas ID
@@ -46,16 +62,34 @@ electrode_localization.activate(
     db_prefix + "electrode_localization", db_prefix + "ccf", linking_module=__name__
 )
 
-nrrd_filepath = find_full_path(
-    get_ephys_root_data_dir(), f"annotation_{voxel_resolution}.nrrd"
-)
-ontology_csv_filepath = find_full_path(get_ephys_root_data_dir(), "query.csv")
 
-if (
-    not (coordinate_framework.CCF & {"ccf_id": ccf_id})
-    and nrrd_filepath.exists()
-    and ontology_csv_filepath.exists()
-):
+def get_ccf_filepaths(voxel_resolution: int = voxel_resolution) -> tuple:
+    """Return the CCF annotation volume and ontology files in the root data dirs
+
+    Args:
+        voxel_resolution (int, optional): Voxel resolution in microns. Defaults to
+            the module's voxel_resolution.
+
+    Returns:
+        nrrd_filepath (pathlib.Path): Annotation volume
+        ontology_csv_filepath (pathlib.Path): Brain region ontology
+    """
+    root_dirs = get_ephys_root_data_dir()
+    return (
+        find_full_path(root_dirs, f"annotation_{voxel_resolution}.nrrd"),
+        find_full_path(root_dirs, "query.csv"),
+    )
+
+
+def ensure_ccf_loaded():
+    """Load the CCF files into coordinate_framework unless already loaded
+
+    Called by `populate_electrode_positions` and `get_electrode_brain_regions`.
+    """
+    if coordinate_framework.CCF & {"ccf_id": ccf_id}:
+        return
+    logger.info(f"Loading CCF {ccf_id} into coordinate_framework")
+    nrrd_filepath, ontology_csv_filepath = get_ccf_filepaths(voxel_resolution)
     coordinate_framework.load_ccf_annotation(
         ccf_id=ccf_id,
         version_name="ccf_2017",
@@ -63,3 +97,128 @@ if (
         nrrd_filepath=nrrd_filepath,
         ontology_csv_filepath=ontology_csv_filepath,
     )
+
+
+def populate_electrode_positions(*restrictions, **populate_settings):
+    """Load the CCF if needed, then populate electrode_localization.ElectrodePosition
+
+    Args:
+        *restrictions: Restrictions passed to `ElectrodePosition.populate`
+        **populate_settings: Keyword arguments passed to `ElectrodePosition.populate`
+    """
+    ensure_ccf_loaded()
+    electrode_localization.ElectrodePosition.populate(
+        *restrictions, **populate_settings
+    )
+
+
+_annotation_volumes = {}
+
+
+def get_annotation_volume(voxel_resolution: int = voxel_resolution) -> np.ndarray:
+    """Return the CCF annotation volume, memory-mapped from a local .npy cache
+
+    The nrrd file is decoded once and saved as annotation_<resolution>.npy in the
+    processed data root directory (or next to the nrrd file if not configured).
+    Later calls, in this or other processes, map that file read-only, so worker
+    processes share one page-cached copy of the volume.
+
+    Args:
+        voxel_resolution (int, optional): Voxel resolution in microns. Defaults to
+            the module's voxel_resolution.
+
+    Returns:
+        volume (np.ndarray): Read-only annotation volume, indexed AP (x), DV (y),
+            ML (z) in voxels
+    """
+    if voxel_resolution in _annotation_volumes:
+        return _annotation_volumes[voxel_resolution]
+
+    nrrd_filepath, _ = get_ccf_filepaths(voxel_resolution)
+    cache_dir = get_processed_root_data_dir() or nrrd_filepath.parent
+    npy_filepath = pathlib.Path(cache_dir) / f"annotation_{voxel_resolution}.npy"
+    if not npy_filepath.exists():
+        import nrrd
+
+        volume, _ = nrrd.read(nrrd_filepath.as_posix())
+        partial_filepath = npy_filepath.with_name(f"{npy_filepath.name}.{os.getpid()}")
+        with open(partial_filepath, "wb") as f:
+            np.save(f, volume)
+        os.replace(partial_filepath, npy_filepath)
+
+    _annotation_volumes[voxel_resolution] = np.load(npy_filepath, mmap_mode="r")
+    return _annotation_volumes[voxel_resolution]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_region_acronyms(ontology_csv_filepath) -> np.ndarray:
+    """Return region acronyms indexed by annotation value, as loaded by the element
+
+    `load_ccf_annotation` assigns the voxels whose annotation value equals an
+    ontology row's position in query.csv to that row's region (not the voxels equal
+    to the row's structure id), so the same mapping is used here to match the
+    database.
+
+    Args:
+        ontology_csv_filepath (pathlib.Path): Brain region ontology
+
+    Returns:
+        acronyms (np.ndarray): Snake case acronym of each ontology row
+    """
+    with open(ontology_csv_filepath, newline="") as f:
+        return np.array(
+            [
+                coordinate_framework.BrainRegionAnnotation.retrieve_acronym(
+                    row["acronym"]
+                )
+                for row in csv.DictReader(f)
+            ],
+            dtype=object,
+        )
+
+
+def get_electrode_brain_regions(insertion_key: dict, method: str = "numpy") -> dict:
+    """Return the brain region of each localized electrode of a probe insertion
+
+    Args:
+        insertion_key (dict): Key of one electrode_localization.ElectrodePosition,
+            ccf_id may be left out if the insertion is localized in one CCF only
+        method (str, optional): "numpy" looks up all electrode voxels at once in
+            the memory-mapped annotation volume, "database" joins
+            ElectrodePosition.Electrode with BrainRegionAnnotation.Voxel. Both give
+            the same result. Defaults to "numpy".
+
+    Raises:
+        ValueError: Unknown method
+
+    Returns:
+        brain_regions (dict): Region acronym by electrode, for electrodes in an
+            annotated voxel
+    """
+    ensure_ccf_loaded()
+    electrodes = electrode_localization.ElectrodePosition.Electrode & insertion_key
+    if method == "database":
+        electrode_ids, acronyms = (
+            electrodes * coordinate_framework.BrainRegionAnnotation.Voxel
+        ).fetch("electrode", "acronym")
+        return dict(zip(electrode_ids.tolist(), acronyms.tolist()))
+    if method != "numpy":
+        raise ValueError(f"Unknown brain region lookup method: {method}")
+
+    resolution = (coordinate_framework.CCF & electrodes).fetch1("ccf_resolution")
+    electrode_ids, x, y, z = electrodes.fetch("electrode", "x", "y", "z")
+    volume = get_annotation_volume(int(resolution))
+    region_acronyms = _get_region_acronyms(get_ccf_filepaths(int(resolution))[1])
+
+    # Electrode coordinates are quantized to the voxel grid in microns
+    voxels = np.stack([x, y, z], axis=1).astype(int) // int(resolution)
+    in_volume = np.all((voxels >= 0) & (voxels < volume.shape), axis=1)
+    annotations = np.full(len(electrode_ids), -1, dtype=np.int64)
+    annotations[in_volume] = volume[tuple(voxels[in_volume].T)]
+    in_region = (annotations >= 0) & (annotations < len(region_acronyms))
+    return dict(
+        zip(
+            electrode_ids[in_region].tolist(),
+            region_acronyms[annotations[in_region]].tolist(),
+        )
+    )
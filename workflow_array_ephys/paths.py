@@ -1,17 +1,112 @@
+import math
+import os
 import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import datajoint as dj
-import element_interface
+from element_interface.utils import find_full_path as _find_full_path
+from element_interface.utils import find_root_directory
+
+# Memoized path lookups, cleared whenever the configuration they depend on changes
+_path_cache = {
+    "config": None,
+    "session_dir": {},
+    "full_path": {},
+    "localization_dir": {},
+}
+_path_cache_stats = {"hits": 0, "misses": 0}
+_path_cache_lock = threading.Lock()
+
+# Root data directories ordered by measured latency, per configured list of roots
+_root_order_cache = {}
+
+# Local staging directory searched before the root data directories, see `staging`
+_staging_dir = None
+
 
 def get_ephys_root_data_dir():
     """Return root directory for ephys from 'ephys_root_data_dir' in dj.config
 
+    'ephys_root_data_dir' may be a list of replicas of the raw data, e.g. a local
+    cache, a network share and an archive. The list is then returned fastest first,
+    as measured once per process by `_measure_root_latency`, with the configured
+    order breaking ties within a millisecond, so that `find_full_path` picks the
+    fastest copy.
+
+    Within `use_staging_dir`, the staging directory is returned first.
+
     Returns:
         path (any): List of path(s) if available or None
     """
 
     data_dir = dj.config.get("custom", {}).get("ephys_root_data_dir", None)
-    return pathlib.Path(data_dir) if data_dir else None
+    if not data_dir:
+        return None
+    root_dirs = _ordered_root_dirs(data_dir)
+    if _staging_dir is None:
+        return root_dirs
+    return [_staging_dir] + (root_dirs if isinstance(root_dirs, list) else [root_dirs])
+
+
+def _ordered_root_dirs(data_dir):
+    """Return the configured root data director(y/ies), fastest first"""
+    if not isinstance(data_dir, (list, tuple)):
+        return pathlib.Path(data_dir)
+
+    root_dirs = tuple(str(root_dir) for root_dir in data_dir)
+    if root_dirs not in _root_order_cache:
+        with ThreadPoolExecutor(len(root_dirs)) as executor:
+            latencies = list(executor.map(_measure_root_latency, root_dirs))
+        # Roots within the same millisecond keep their configured order
+        latency_ms = [
+            latency // 1e-3 if math.isfinite(latency) else math.inf
+            for latency in latencies
+        ]
+        order = sorted(range(len(root_dirs)), key=lambda i: (latency_ms[i], i))
+        _root_order_cache[root_dirs] = [pathlib.Path(root_dirs[i]) for i in order]
+    return list(_root_order_cache[root_dirs])
+
+
+@contextmanager
+def use_staging_dir(staging_dir):
+    """Search a local staging directory first for raw data within the context
+
+    Args:
+        staging_dir (str): Directory mirroring the layout of the root data
+            directories for the files copied into it
+    """
+    global _staging_dir
+    previous_staging_dir, _staging_dir = _staging_dir, pathlib.Path(staging_dir)
+    try:
+        yield
+    finally:
+        _staging_dir = previous_staging_dir
+
+
+def _measure_root_latency(root_dir: str, repeats: int = 3) -> float:
+    """Return the best time, in seconds, to stat and list a root data directory
+
+    Args:
+        root_dir (str): Root data directory
+        repeats (int, optional): Number of measurements. Defaults to 3.
+
+    Returns:
+        latency (float): Best time of the measurements, or inf if unavailable
+    """
+    latency = math.inf
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        try:
+            os.stat(root_dir)
+            with os.scandir(root_dir) as entries:
+                next(entries, None)
+        except OSError:
+            return math.inf
+        latency = min(latency, time.perf_counter() - start_time)
+    return latency
 
 
 def get_processed_root_data_dir():
@@ -24,9 +119,118 @@ def get_processed_root_data_dir():
     return pathlib.Path(data_dir) if data_dir else None
 
 
+def _config_fingerprint() -> tuple:
+    """Return the dj.config entries the cached path lookups depend on"""
+    custom = dj.config.get("custom", {})
+    return (
+        dj.config.get("database.host"),
+        custom.get("database.prefix", ""),
+        repr(custom.get("ephys_root_data_dir")),
+    )
+
+
+def _cached_lookup(cache_name: str, cache_key, lookup):
+    """Return a cached lookup result, calling `lookup()` on a miss
+
+    Args:
+        cache_name (str): Name of the cache in `_path_cache`
+        cache_key (any): Hashable key of the lookup within the cache
+        lookup (callable): Computes the result on a cache miss. None results are
+            not cached.
+
+    Returns:
+        result (any): Result of the lookup
+    """
+    fingerprint = _config_fingerprint()
+    with _path_cache_lock:
+        cache = _current_cache(cache_name, fingerprint)
+        if cache_key in cache:
+            _path_cache_stats["hits"] += 1
+            return cache[cache_key]
+        _path_cache_stats["misses"] += 1
+
+    result = lookup()
+    with _path_cache_lock:
+        if result is not None and _path_cache["config"] == fingerprint:
+            cache[cache_key] = result
+    return result
+
+
+def _current_cache(cache_name: str, fingerprint: tuple) -> dict:
+    """Return a path cache, first clearing all caches if the config changed
+
+    Must be called with `_path_cache_lock` held.
+
+    Args:
+        cache_name (str): Name of the cache in `_path_cache`
+        fingerprint (tuple): Current `_config_fingerprint()`
+
+    Returns:
+        cache (dict): The cache
+    """
+    if _path_cache["config"] != fingerprint:
+        for name in ("session_dir", "full_path", "localization_dir"):
+            _path_cache[name].clear()
+        _path_cache["config"] = fingerprint
+    return _path_cache[cache_name]
+
+
+def clear_path_cache():
+    """Clear the cached path lookups and reset the hit/miss counters"""
+    with _path_cache_lock:
+        for name in ("session_dir", "full_path", "localization_dir"):
+            _path_cache[name].clear()
+        _path_cache["config"] = None
+        _path_cache_stats.update(hits=0, misses=0)
+
+
+def path_cache_info() -> dict:
+    """Return the hit/miss counters and the size of each path cache
+
+    Returns:
+        info (dict): Number of hits, misses and cached entries per cache
+    """
+    with _path_cache_lock:
+        return {
+            **_path_cache_stats,
+            **{
+                f"{name}_size": len(_path_cache[name])
+                for name in ("session_dir", "full_path", "localization_dir")
+            },
+        }
+
+
+def find_full_path(root_directories, relative_path) -> pathlib.Path:
+    """Memoized `element_interface.utils.find_full_path`
+
+    Only paths that are found are cached, so a missing file is searched again on
+    the next call.
+
+    Args:
+        root_directories (any): Root directory or list of root directories
+        relative_path (str): Path relative to one of the root directories
+
+    Returns:
+        path (pathlib.Path): Full path of the existing file or directory
+    """
+    if not isinstance(root_directories, (list, tuple)):
+        root_directories = [root_directories]
+    cache_key = (
+        tuple(str(root_dir) for root_dir in root_directories),
+        pathlib.Path(relative_path).as_posix(),
+    )
+    return _cached_lookup(
+        "full_path",
+        cache_key,
+        lambda: _find_full_path(list(root_directories), relative_path),
+    )
+
+
 def get_session_directory(session_key: dict) -> str:
     """Return relative path from SessionDirectory table given key
 
+    Results are cached per session, see `path_cache_info` and `clear_path_cache`.
+
     Args:
         session_key (dict): Key uniquely identifying a session
 
@@ -35,12 +239,92 @@ def get_session_directory(session_key: dict) -> str:
     """
     from .pipeline import session
 
-    return (session.SessionDirectory & session_key).fetch1("session_dir")
+    return _cached_lookup(
+        "session_dir",
+        _session_cache_key(session_key),
+        lambda: (session.SessionDirectory & session_key).fetch1("session_dir"),
+    )
+
+
+def get_session_directories(restriction=None, n_workers: int = 8) -> dict:
+    """Return full session directory paths of all sessions matching a restriction
+
+    Fetches all matching SessionDirectory rows in one query, fills the cache used
+    by `get_session_directory`, and resolves the paths against the root data
+    directories on a thread pool.
+
+    Args:
+        restriction (any, optional): DataJoint restriction on SessionDirectory.
+            Defaults to None, all sessions.
+        n_workers (int, optional): Number of threads searching the root data
+            directories. Defaults to 8.
+
+    Returns:
+        paths (dict): Full path of each session directory, or None if not found,
+            keyed by the tuple of the session's primary key values
+    """
+    from .pipeline import session
+
+    fingerprint = _config_fingerprint()
+    session_dirs = session.SessionDirectory()
+    if restriction is not None:
+        session_dirs &= restriction
+    keys, rel_dirs = session_dirs.fetch("KEY", "session_dir")
+
+    with _path_cache_lock:
+        cache = _current_cache("session_dir", fingerprint)
+        cache.update(zip(map(_session_cache_key, keys), rel_dirs))
+
+    root_dirs = get_ephys_root_data_dir()
+
+    def resolve(rel_dir):
+        try:
+            return find_full_path(root_dirs, rel_dir)
+        except FileNotFoundError:
+            return None
+
+    with ThreadPoolExecutor(n_workers) as executor:
+        full_paths = list(executor.map(resolve, rel_dirs))
+
+    return {
+        tuple(key[k] for k in session.Session.primary_key): full_path
+        for key, full_path in zip(keys, full_paths)
+    }
+
+
+def get_session_root(session_key: dict) -> pathlib.Path:
+    """Return the root data directory a session's data is read from
+
+    With several roots, this is the fastest root holding a copy of the session.
+
+    Args:
+        session_key (dict): Key uniquely identifying a session
+
+    Returns:
+        path (pathlib.Path): Root data directory of the session directory
+    """
+    root_dirs = get_ephys_root_data_dir()
+    return find_root_directory(
+        root_dirs, find_full_path(root_dirs, get_session_directory(session_key))
+    )
+
+
+def _session_cache_key(session_key: dict) -> tuple:
+    """Return the hashable session primary key of a key, for the path caches"""
+    from .pipeline import session
+
+    return tuple(
+        sorted(
+            (k, v) for k, v in session_key.items() if k in session.Session.primary_key
+        )
+    )
 
 
 def get_electrode_localization_dir(probe_insertion_key: dict) -> str:
     """Return root directory of localization data for a given probe
 
+    Results are cached per insertion, see `get_electrode_localization_dirs`.
+
     Args:
         probe_insertion_key (dict): key uniquely identifying one ephys.EphysRecording
 
@@ -49,25 +333,98 @@ def get_electrode_localization_dir(probe_insertion_key: dict) -> str:
     """
     from .pipeline import ephys
 
-    acq_software = (ephys.EphysRecording & probe_insertion_key).fetch1("acq_software")
-
-    if acq_software == "SpikeGLX":
-        spikeglx_meta_filepath = pathlib.Path(
-            (
-                ephys.EphysRecording.EphysFile
-                & probe_insertion_key
-                & 'file_path LIKE "%.ap.meta"'
-            ).fetch1("file_path")
+    cache_key = tuple(
+        sorted(
+            (k, v)
+            for k, v in probe_insertion_key.items()
+            if k in ephys.EphysRecording.primary_key
         )
-        probe_dir = element_interface.utils.find_full_path(
-            get_ephys_root_data_dir(), spikeglx_meta_filepath.parent
+    )
+    probe_dir = _cached_lookup(
+        "localization_dir",
+        cache_key,
+        lambda: _find_electrode_localization_dirs(probe_insertion_key).get(cache_key),
+    )
+    if probe_dir is None:
+        raise FileNotFoundError(
+            f"No localization data directory found for {probe_insertion_key}"
         )
-    elif acq_software == "Open Ephys":
-        probe_path = (ephys.EphysRecording.EphysFile & probe_insertion_key).fetch1(
-            "file_path"
+    return probe_dir
+
+
+def get_electrode_localization_dirs(restriction=None) -> dict:
+    """Return root directories of localization data for many probes at once
+
+    Fetches the recording files of all matching insertions in one query, instead of
+    one suffix LIKE query per insertion, and caches each directory for
+    `get_electrode_localization_dir`.
+
+    Args:
+        restriction (any, optional): DataJoint restriction on ephys.EphysRecording.
+            Defaults to None, all recordings.
+
+    Returns:
+        paths (dict): Full path to the localization data of each probe, or None if
+            not found, keyed by the tuple of the recording's primary key values
+    """
+    from .pipeline import ephys
+
+    fingerprint = _config_fingerprint()
+    probe_dirs = _find_electrode_localization_dirs(restriction)
+    with _path_cache_lock:
+        cache = _current_cache("localization_dir", fingerprint)
+        cache.update(
+            (cache_key, probe_dir)
+            for cache_key, probe_dir in probe_dirs.items()
+            if probe_dir is not None
         )
-        probe_dir = element_interface.utils.find_full_path(
-            get_ephys_root_data_dir(), probe_path
+
+    return {
+        tuple(dict(cache_key)[k] for k in ephys.EphysRecording.primary_key): probe_dir
+        for cache_key, probe_dir in probe_dirs.items()
+    }
+
+
+def _find_electrode_localization_dirs(restriction=None) -> dict:
+    """Query and search the localization data directories of probes
+
+    SpikeGLX data is in the directory of the recording's .ap.meta file, Open Ephys
+    data at the recording's single file path.
+
+    Args:
+        restriction (any, optional): DataJoint restriction on ephys.EphysRecording
+
+    Returns:
+        paths (dict): Full path to localization data, or None if not found, keyed by
+            the sorted (attribute, value) pairs of the recording's primary key
+    """
+    from .pipeline import ephys
+
+    recording_files = (
+        ephys.EphysRecording.proj("acq_software") * ephys.EphysRecording.EphysFile
+    )
+    if restriction is not None:
+        recording_files &= restriction
+
+    primary_key = ephys.EphysRecording.primary_key
+    file_paths = {}
+    for row in recording_files.fetch(as_dict=True):
+        cache_key = tuple(sorted((k, row[k]) for k in primary_key))
+        file_paths.setdefault(cache_key, (row["acq_software"], []))[1].append(
+            row["file_path"]
         )
 
-    return probe_dir
+    root_dirs = get_ephys_root_data_dir()
+    probe_dirs = {}
+    for cache_key, (acq_software, paths) in file_paths.items():
+        if acq_software == "SpikeGLX":
+            paths = [pathlib.Path(p).parent for p in paths if p.endswith(".ap.meta")]
+        elif acq_software != "Open Ephys":
+            paths = []
+        probe_dirs[cache_key] = None
+        if len(paths) == 1:
+            try:
+                probe_dirs[cache_key] = find_full_path(root_dirs, paths[0])
+            except FileNotFoundError:
+                pass
+    return probe_dirs
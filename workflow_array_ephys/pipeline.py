@@ -13,9 +13,12 @@ from element_session.session_with_datetime import Session
 from . import analysis
 from .paths import (
     get_electrode_localization_dir,
+    get_electrode_localization_dirs,
     get_ephys_root_data_dir,
     get_processed_root_data_dir,
+    get_session_directories,
     get_session_directory,
+    get_session_root,
 )
 
 if "custom" not in dj.config:
@@ -64,7 +67,10 @@ __all__ = [
     # paths
     "get_ephys_root_data_dir",
     "get_session_directory",
+    "get_session_directories",
+    "get_session_root",
     "get_electrode_localization_dir",
+    "get_electrode_localization_dirs",
     # export
     "subject_to_nwb",
     "ecephys_session_to_nwb",
@@ -1,10 +1,39 @@
+import multiprocessing as mp
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from workflow_array_ephys.paths import use_staging_dir
 from workflow_array_ephys.pipeline import ephys
+from workflow_array_ephys.staging import RecordingStager
+
+# In dependency order
+_populate_tables = (
+    "EphysRecording",
+    "LFP",
+    "Clustering",
+    "CuratedClustering",
+    "WaveformSet",
+)
+
+# Upstream stages of each stage of the key-level scheduler
+_stage_upstream = {
+    "EphysRecording": (),
+    "LFP": ("EphysRecording",),
+    "Clustering": ("EphysRecording",),
+    "CuratedClustering": ("Clustering",),
+    "WaveformSet": ("CuratedClustering",),
+    "QualityMetrics": ("CuratedClustering",),
+}
 
 
 def run(
     display_progress: bool = True,
     reserve_jobs: bool = False,
     suppress_errors: bool = False,
+    n_workers: int = 1,
+    poll_interval: float = 5.0,
 ):
     """Execute all populate commands in Element Array Ephys
 
@@ -12,6 +41,16 @@ def run(
         display_progress (bool, optional): See DataJoint `populate`. Defaults to True.
         reserve_jobs (bool, optional): See DataJoint `populate`. Defaults to False.
         suppress_errors (bool, optional): See DataJoint `populate`. Defaults to False.
+        n_workers (int, optional): Number of worker processes. When greater than 1,
+            each worker opens its own connection and populates all tables with job
+            reservation, so downstream keys start as soon as their upstream keys are
+            done. Defaults to 1, populate each table in turn.
+        poll_interval (float, optional): Seconds workers wait for other workers'
+            reserved jobs before checking for new keys. Defaults to 5.0.
+
+    With a single worker and dj.config["custom"]["ephys_staging_dir"] set, the raw
+    SpikeGLX files of each LFP and WaveformSet key are copied to local disk ahead
+    of its populate, see `staging.RecordingStager`.
     """
 
     populate_settings = {
@@ -20,11 +59,17 @@ def run(
         "suppress_errors": suppress_errors,
     }
 
+    if n_workers > 1:
+        _run_parallel(n_workers, suppress_errors, poll_interval)
+        return
+
     print("\n---- Populate ephys.EphysRecording ----")
     ephys.EphysRecording.populate(**populate_settings)
 
+    stager = RecordingStager.from_config()
+
     print("\n---- Populate ephys.LFP ----")
-    ephys.LFP.populate(**populate_settings)
+    _populate_staged(ephys.LFP(), stager, populate_settings)
 
     print("\n---- Populate ephys.Clustering ----")
     ephys.Clustering.populate(**populate_settings)
@@ -33,8 +78,234 @@ def run(
     ephys.CuratedClustering.populate(**populate_settings)
 
     print("\n---- Populate ephys.WaveformSet ----")
-    ephys.WaveformSet.populate(**populate_settings)
+    _populate_staged(ephys.WaveformSet(), stager, populate_settings)
+
+
+def _populate_staged(table, stager, populate_settings: dict):
+    """Populate a table key by key, reading raw data staged on local disk
+
+    Args:
+        table (dj.Table): ephys table reading raw recordings
+        stager (RecordingStager): Stages raw files ahead of populate, or None to
+            populate the whole table from the root data directories
+        populate_settings (dict): Keyword arguments of DataJoint `populate`
+    """
+    if stager is None:
+        table.populate(**populate_settings)
+        return
+
+    keys = (table.key_source - table).fetch("KEY")
+    with use_staging_dir(stager.staging_dir):
+        for key in stager.staged(keys):
+            table.populate(key, **populate_settings)
+
+
+def _run_parallel(n_workers: int, suppress_errors: bool, poll_interval: float):
+    """Populate all tables from a pool of worker processes and report throughput
+
+    Args:
+        n_workers (int): Number of worker processes
+        suppress_errors (bool): See DataJoint `populate`
+        poll_interval (float): Seconds to wait for other workers' reserved jobs
+    """
+    print(f"\n---- Populate ephys tables with {n_workers} workers ----")
+    start_time = time.time()
+
+    with mp.get_context("spawn").Pool(n_workers, _initialize_worker) as pool:
+        worker_stats = pool.starmap(
+            _populate_worker, [(suppress_errors, poll_interval)] * n_workers
+        )
+
+    _report_throughput(_populate_tables, worker_stats, time.time() - start_time)
+
+
+def run_scheduled(
+    n_workers: int = 2,
+    stage_limits: dict = None,
+    display_progress: bool = True,
+    suppress_errors: bool = False,
+):
+    """Populate ephys tables key by key, dispatching each key as soon as it is ready
+
+    Each probe insertion moves through EphysRecording -> LFP/Clustering ->
+    CuratedClustering -> WaveformSet/QualityMetrics independently of the others.
+    When a key is populated, the downstream keys it unblocks are dispatched right
+    away instead of waiting for the whole upstream table.
+
+    Args:
+        n_workers (int, optional): Number of worker processes. Defaults to 2.
+        stage_limits (dict, optional): Maximum number of keys of a stage populated at
+            the same time, e.g. {"LFP": 2, "WaveformSet": 1} for I/O-bound LFP and
+            memory-heavy waveform extraction. Defaults to n_workers for every stage.
+        display_progress (bool, optional): Print each populated key. Defaults to True.
+        suppress_errors (bool, optional): See DataJoint `populate`. Defaults to False.
+    """
+    stages = [stage for stage in _stage_upstream if hasattr(ephys, stage)]
+    stage_limits = {
+        stage: min((stage_limits or {}).get(stage, n_workers), n_workers)
+        for stage in stages
+    }
+    if any(limit < 1 for limit in stage_limits.values()):
+        raise ValueError(f"Stage limits must be at least 1: {stage_limits}")
+    downstream = {
+        stage: [s for s in stages if stage in _stage_upstream[s]] for stage in stages
+    }
+
+    queues = {stage: deque() for stage in stages}
+    queued = set()
 
+    def enqueue(stage, restriction):
+        table = getattr(ephys, stage)()
+        for key in ((table.key_source - table) & restriction).fetch("KEY"):
+            task_id = (stage, tuple(sorted(key.items())))
+            if task_id not in queued:
+                queued.add(task_id)
+                queues[stage].append(key)
 
-if __name__ == "__main__":
-    run()
+    for stage in stages:
+        enqueue(stage, {})
+
+    print(f"\n---- Populate ephys tables with {n_workers} scheduled workers ----")
+    start_time = time.time()
+    stats = {stage: {"key_count": 0, "make_time": 0.0} for stage in stages}
+    running, in_flight = {}, {stage: 0 for stage in stages}
+    with ProcessPoolExecutor(
+        n_workers, mp_context=mp.get_context("spawn"), initializer=_initialize_worker
+    ) as executor:
+        while running or any(queues.values()):
+            for stage, queue in queues.items():
+                while (
+                    queue
+                    and in_flight[stage] < stage_limits[stage]
+                    and len(running) < n_workers
+                ):
+                    future = executor.submit(
+                        _populate_key, stage, queue.popleft(), suppress_errors
+                    )
+                    running[future] = stage
+                    in_flight[stage] += 1
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                in_flight[stage] -= 1
+                key, populated, make_time = future.result()
+                if populated:
+                    stats[stage]["key_count"] += 1
+                    stats[stage]["make_time"] += make_time
+                    if display_progress:
+                        print(f"ephys.{stage}: {key} ({make_time:.1f} s)")
+                elif key not in getattr(ephys, stage)():
+                    continue  # failed, or still in progress in another process
+                # Populated here or elsewhere, either way its downstream keys are ready
+                for downstream_stage in downstream[stage]:
+                    enqueue(downstream_stage, key)
+
+    _report_throughput(stages, [stats], time.time() - start_time)
+
+
+def _report_throughput(table_names: list, worker_stats: list, elapsed: float):
+    """Print keys populated and time per key for each table, summed over workers
+
+    Args:
+        table_names (list): Names of the ephys tables to report
+        worker_stats (list): Per worker, number of keys populated and time spent
+            per table
+        elapsed (float): Wall time in seconds
+    """
+    print(f"\n---- Throughput ({elapsed:.1f} s wall time) ----")
+    for table_name in table_names:
+        key_count = sum(s[table_name]["key_count"] for s in worker_stats)
+        make_time = sum(s[table_name]["make_time"] for s in worker_stats)
+        print(
+            f"ephys.{table_name}: {key_count} key(s), "
+            + f"{make_time / key_count if key_count else 0:.1f} s/key, "
+            + f"{key_count / elapsed * 60:.2f} key(s)/min"
+        )
+
+
+def _initialize_worker():
+    """Open a new database connection in the worker process"""
+    ephys.schema.connection.connect()
+
+
+def _populate_worker(suppress_errors: bool, poll_interval: float) -> dict:
+    """Populate all tables with job reservation until no work is left
+
+    Every pass visits the tables in dependency order, so keys whose upstream has
+    been populated (by any worker) are picked up on the next pass. The worker stops
+    after a pass without progress once no live connection holds a reservation.
+
+    Args:
+        suppress_errors (bool): See DataJoint `populate`
+        poll_interval (float): Seconds to wait for other workers' reserved jobs
+
+    Returns:
+        stats (dict): Number of keys populated and time spent per table
+    """
+    stats = {name: {"key_count": 0, "make_time": 0.0} for name in _populate_tables}
+    tables = [getattr(ephys, name)() for name in _populate_tables]
+
+    while True:
+        key_count = 0
+        for table_name, table in zip(_populate_tables, tables):
+            keys = (table.key_source - table).fetch("KEY")
+            random.shuffle(keys)  # spread workers over the pending keys
+            for key in keys:
+                key, populated, make_time = _populate_key(
+                    table_name, key, suppress_errors
+                )
+                if populated:
+                    stats[table_name]["key_count"] += 1
+                    stats[table_name]["make_time"] += make_time
+                    key_count += 1
+        if not key_count:
+            if not _live_reserved_jobs(tables):
+                return stats
+            time.sleep(poll_interval)  # upstream keys still in progress elsewhere
+
+
+def _live_reserved_jobs(tables: list):
+    """Return the tables' jobs reserved by database connections still open
+
+    Reservations left by killed or crashed workers keep the id of a closed
+    connection and are ignored. Connections of other database users are only
+    listed with the PROCESS privilege, otherwise their reservations are ignored
+    too.
+
+    Args:
+        tables (list): ephys tables
+
+    Returns:
+        jobs (dj.Table): Restriction of schema.jobs to the live reservations
+    """
+    connection_ids = ephys.schema.connection.query(
+        "SELECT id FROM information_schema.processlist"
+    ).fetchall()
+    return (
+        ephys.schema.jobs
+        & {"status": "reserved"}
+        & [{"table_name": table.table_name} for table in tables]
+        & [{"connection_id": connection_id} for (connection_id,) in connection_ids]
+    )
+
+
+def _populate_key(table_name: str, key: dict, suppress_errors: bool) -> tuple:
+    """Populate one key of an ephys table with job reservation
+
+    Args:
+        table_name (str): Name of the ephys table
+        key (dict): Key of the table's key_source
+        suppress_errors (bool): See DataJoint `populate`
+
+    Returns:
+        key (dict): The key
+        populated (bool): Whether this call populated the key
+        make_time (float): Seconds spent populating
+    """
+    table = getattr(ephys, table_name)()
+    if key in table:  # populated by another worker
+        return key, False, 0.0
+    start_time = time.time()
+    table.populate(key, reserve_jobs=True, suppress_errors=suppress_errors)
+    return key, key in table, time.time() - start_time
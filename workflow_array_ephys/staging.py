@@ -0,0 +1,264 @@
+"""Stage raw SpikeGLX recordings on local disk ahead of populate.
+
+Set dj.config["custom"]["ephys_staging_dir"] to a local scratch directory to enable
+staging in `process.run`, and optionally dj.config["custom"]["ephys_staging_max_gb"]
+to bound its size (default 100). Staged files mirror their path relative to the
+root data directory, so that with `paths.use_staging_dir` the elements resolve the
+local copy first.
+"""
+
+import itertools
+import logging
+import os
+import pathlib
+import shutil
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import datajoint as dj
+
+from .paths import find_full_path, get_ephys_root_data_dir
+
+logger = logging.getLogger("datajoint")
+
+
+def get_staging_dir():
+    """Return the local staging directory from 'ephys_staging_dir' in dj.config
+
+    Returns:
+        path (posixpath): Absolute path if available or None
+    """
+    staging_dir = dj.config.get("custom", {}).get("ephys_staging_dir", None)
+    return pathlib.Path(staging_dir) if staging_dir else None
+
+
+class RecordingStager:
+    """Copy the raw files of SpikeGLX probe insertions into a local staging directory
+
+    Each staged insertion is kept until space is needed for another one, evicting
+    the least recently used first. Insertions handed out by `staged` are pinned
+    until released, so files in use are never evicted.
+
+    Args:
+        staging_dir (str): Local staging directory
+        max_bytes (int): Maximum size of the staged files
+        prefetch (int, optional): Number of keys staged ahead of the current one.
+            Defaults to 2.
+    """
+
+    def __init__(self, staging_dir, max_bytes: int, prefetch: int = 2):
+        self.staging_dir = pathlib.Path(staging_dir)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.root_dirs = get_ephys_root_data_dir()
+        self._lock = threading.Lock()
+        self._pinned = set()
+        for partial_filepath in self.staging_dir.rglob("*.partial"):
+            partial_filepath.unlink()  # copies interrupted in a previous run
+        # Staged file paths relative to the staging directory, least recent first
+        self._staged = OrderedDict()
+        for meta_filepath in sorted(
+            self.staging_dir.rglob("*.ap.meta"), key=lambda p: p.stat().st_mtime
+        ):
+            recording_files = [
+                fp
+                for fp in meta_filepath.parent.iterdir()
+                if fp.name.startswith(meta_filepath.name[: -len("ap.meta")])
+            ]
+            self._staged[meta_filepath.relative_to(self.staging_dir)] = {
+                fp.relative_to(self.staging_dir): fp.stat().st_size
+                for fp in recording_files
+            }
+
+    @classmethod
+    def from_config(cls):
+        """Return a stager for the configured staging directory, or None if unset"""
+        staging_dir = get_staging_dir()
+        if staging_dir is None:
+            return None
+        max_gb = dj.config["custom"].get("ephys_staging_max_gb", 100)
+        return cls(staging_dir, int(max_gb * 1024**3))
+
+    def staged(self, keys):
+        """Yield each key once its raw files are staged, staging the next ones ahead
+
+        The recording files of all keys are looked up first, in one query on the
+        calling thread. Files are then copied on a background thread, which does
+        not use the database connection. A key that cannot be staged is still
+        yielded, and read from the root data directories.
+
+        Args:
+            keys (iterable): ephys.EphysRecording keys, in populate order
+
+        Yields:
+            key (dict): The next key, pinned until the following key is yielded
+        """
+        keys = list(keys)
+        jobs = iter(zip(keys, self.get_meta_relpaths(keys)))
+        with ThreadPoolExecutor(1) as executor:
+            pending = deque(
+                (key, executor.submit(self.stage, meta_relpath))
+                for key, meta_relpath in itertools.islice(jobs, self.prefetch + 1)
+            )
+            while pending:
+                key, future = pending.popleft()
+                try:
+                    meta_relpath = future.result()
+                except OSError as error:
+                    logger.warning(f"Could not stage {key}: {error}")
+                    meta_relpath = None
+                next_job = next(jobs, None)
+                if next_job is not None:
+                    next_key, next_meta_relpath = next_job
+                    pending.append(
+                        (next_key, executor.submit(self.stage, next_meta_relpath))
+                    )
+                try:
+                    yield key
+                finally:
+                    self.release(meta_relpath)
+            for _, future in pending:  # generator closed early
+                if not future.cancel():
+                    try:
+                        self.release(future.result())
+                    except OSError:
+                        pass
+
+    def get_meta_relpaths(self, keys: list) -> list:
+        """Return the .ap.meta file of each key's SpikeGLX recording, in one query
+
+        Args:
+            keys (list): ephys.EphysRecording keys
+
+        Returns:
+            meta_relpaths (list): Per key, .ap.meta file path relative to the root
+                data directory, or None if the recording is not from SpikeGLX
+        """
+        from .pipeline import ephys
+
+        primary_key = ephys.EphysRecording.primary_key
+        recording_keys = [{k: key[k] for k in primary_key} for key in keys]
+        recording_files = (
+            ephys.EphysRecording.proj("acq_software") * ephys.EphysRecording.EphysFile
+            & 'acq_software = "SpikeGLX"'
+            & recording_keys
+        )
+        meta_relpaths = {
+            tuple(row[k] for k in primary_key): pathlib.Path(row["file_path"])
+            for row in recording_files.fetch(as_dict=True)
+            if row["file_path"].endswith(".ap.meta")
+        }
+        return [
+            meta_relpaths.get(tuple(key[k] for k in primary_key))
+            for key in recording_keys
+        ]
+
+    def stage(self, meta_relpath):
+        """Copy the raw files of a SpikeGLX recording into the staging directory
+
+        Bin files are copied first and meta files last, each under a temporary
+        name moved into place once complete, so a staged meta file always comes
+        with complete data. A previous copy whose source files have changed is
+        removed first.
+
+        Args:
+            meta_relpath (pathlib.Path): .ap.meta file path relative to the root
+                data directory, or None to stage nothing
+
+        Returns:
+            meta_relpath (pathlib.Path): The staged .ap.meta file, pinned until
+                released, or None if not staged
+        """
+        if meta_relpath is None:
+            return None
+        meta_relpath = pathlib.Path(meta_relpath)
+        source_dir = find_full_path(self.root_dirs, meta_relpath.parent)
+        prefix = meta_relpath.name[: -len("ap.meta")]
+        recording_files = {
+            meta_relpath.parent / entry.name: entry.stat().st_size
+            for entry in os.scandir(source_dir)
+            if entry.is_file() and entry.name.startswith(prefix)
+        }
+
+        with self._lock:
+            if self._staged.get(meta_relpath) == recording_files:
+                self._staged.move_to_end(meta_relpath)
+                self._pinned.add(meta_relpath)
+                return meta_relpath
+            outdated_files = self._staged.pop(meta_relpath, None)
+            if outdated_files:
+                self._remove_files(outdated_files)
+            if not self._make_room(sum(recording_files.values())):
+                logger.info(f"Not enough staging space for {meta_relpath.parent}")
+                return None
+            self._pinned.add(meta_relpath)
+
+        try:
+            for relpath in sorted(recording_files, key=lambda p: p.suffix == ".meta"):
+                staged_filepath = self.staging_dir / relpath
+                staged_filepath.parent.mkdir(parents=True, exist_ok=True)
+                partial_filepath = staged_filepath.with_name(
+                    staged_filepath.name + ".partial"
+                )
+                shutil.copyfile(source_dir / relpath.name, partial_filepath)
+                os.replace(partial_filepath, staged_filepath)
+        except OSError:
+            self._remove_files(recording_files)
+            self.release(meta_relpath)
+            raise
+
+        with self._lock:
+            self._staged[meta_relpath] = recording_files
+        return meta_relpath
+
+    def release(self, meta_relpath):
+        """Allow a staged probe insertion to be evicted again
+
+        Args:
+            meta_relpath (pathlib.Path): As returned by `stage`
+        """
+        with self._lock:
+            self._pinned.discard(meta_relpath)
+
+    def _make_room(self, n_bytes: int) -> bool:
+        """Evict least recently used unpinned insertions until n_bytes fit
+
+        Must be called with the lock held.
+
+        Args:
+            n_bytes (int): Size of the files about to be staged
+
+        Returns:
+            fits (bool): Whether the files now fit within max_bytes
+        """
+        staged_bytes = sum(sum(files.values()) for files in self._staged.values())
+        pinned_bytes = sum(
+            sum(files.values())
+            for meta_relpath, files in self._staged.items()
+            if meta_relpath in self._pinned
+        )
+        if pinned_bytes + n_bytes > self.max_bytes:
+            return False
+        for meta_relpath in list(self._staged):
+            if staged_bytes + n_bytes <= self.max_bytes:
+                break
+            if meta_relpath in self._pinned:
+                continue
+            files = self._staged.pop(meta_relpath)
+            self._remove_files(files)
+            staged_bytes -= sum(files.values())
+        return True
+
+    def _remove_files(self, relpaths):
+        """Remove staged files, meta files first so the copy disappears at once"""
+        for relpath in sorted(relpaths, key=lambda p: p.suffix != ".meta"):
+            for filepath in (
+                self.staging_dir / relpath,
+                (self.staging_dir / relpath).with_name(relpath.name + ".partial"),
+            ):
+                try:
+                    filepath.unlink()
+                except FileNotFoundError:
+                    pass